@@ -0,0 +1,266 @@
+# 性能基准: 用合成的 YouTube 响应分别测量流水线各阶段的耗时和内存峰值
+# 用法: python bench.py --regions 10,50,100 --videos 1000,10000,50000 --channels 10,500,5000
+# 结果写入 JSON (默认 bench_results.json), 可在不同提交之间对比
+import os
+import json
+import time
+import random
+import argparse
+import tempfile
+import platform
+import statistics
+import subprocess
+import tracemalloc
+from urllib.parse import urlsplit, parse_qsl
+
+# 导入 main 之前: 缓存放到临时目录, 放开限流, 避免影响本地缓存和测量结果
+BENCH_DIR = tempfile.mkdtemp(prefix="vision-bench-")
+os.environ['CACHE_DIR'] = BENCH_DIR
+os.environ.setdefault('API_QPS', '1000000')
+os.environ.setdefault('API_QUOTA_BUDGET', '1000000000')
+os.environ.setdefault('RUN_DEADLINE_S', '1000000')
+
+import httplib2
+import main
+
+CATEGORIES = ['10', '24', '22', '28', '17', '26', '20', '1', '25']
+DURATIONS = ['PT45S', 'PT3M12S', 'PT8M', 'PT12M5S', 'PT1H2M3S']
+REAL_REGIONS = list(main.TARGET_REGIONS)
+
+# --- 合成数据 ---
+def region_codes(n):
+    codes = REAL_REGIONS[:n]
+    for a in 'ABCDEFGHIJKLMNOPQRSTUVWXYZ':
+        for b in 'ABCDEFGHIJKLMNOPQRSTUVWXYZ':
+            if len(codes) >= n: return codes
+            if a + b not in codes: codes.append(a + b)
+    return codes
+
+def channel_id(i):
+    return f"UC{i:022d}"
+
+def make_thumbnails(vid):
+    return {size: {'url': f"https://i.ytimg.com/vi/{vid}/{size}.jpg", 'width': w, 'height': h}
+            for size, w, h in [('default', 120, 90), ('medium', 320, 180), ('high', 480, 360),
+                               ('standard', 640, 480), ('maxres', 1280, 720)]}
+
+def make_video(rnd, vid, cid):
+    # 字段和体积尽量接近真实的 videos().list 返回
+    title = f"Video {vid} " + ' '.join(rnd.choice(['epic', 'new', 'official', 'live', 'review', 'vlog']) for _ in range(6))
+    return {
+        'kind': 'youtube#video', 'etag': f"etag-{vid}", 'id': vid,
+        'snippet': {
+            'publishedAt': '2026-01-01T00:00:00Z', 'channelId': cid, 'title': title,
+            'description': 'lorem ipsum ' * rnd.randint(10, 120),
+            'thumbnails': make_thumbnails(vid), 'channelTitle': f"Channel {cid[-6:]}",
+            'tags': [f"tag{k}" for k in range(rnd.randint(0, 25))],
+            'categoryId': rnd.choice(CATEGORIES), 'liveBroadcastContent': 'none',
+            'localized': {'title': title, 'description': 'lorem ipsum ' * 10},
+        },
+        'contentDetails': {'duration': rnd.choice(DURATIONS), 'dimension': '2d', 'definition': 'hd'},
+        'statistics': {
+            'viewCount': str(rnd.randint(1000, 50000000)), 'likeCount': str(rnd.randint(0, 2000000)),
+            'favoriteCount': '0', 'commentCount': str(rnd.randint(0, 100000)),
+        },
+    }
+
+def make_videos(n, n_channels, seed=0):
+    # 直接生成解析后的 VideoRecord, 用于排名和渲染阶段
+    rnd = random.Random(seed)
+    videos = []
+    for i in range(n):
+        v = main.parse_video_item(make_video(rnd, f"vid{i:08d}", channel_id(rnd.randrange(max(n_channels, 1)))))
+        v.region_flag = main.region_flag(rnd.choice(REAL_REGIONS))
+        videos.append(v)
+    return videos
+
+def make_channels_page(ids, part):
+    items = []
+    for cid in ids:
+        item = {'kind': 'youtube#channel', 'etag': f"etag-{cid}", 'id': cid}
+        if 'statistics' in part:
+            subs = random.Random(cid).randint(0, 20000000)
+            item['statistics'] = {'viewCount': str(subs * 40), 'subscriberCount': str(subs), 'videoCount': '100'}
+        if 'contentDetails' in part:
+            item['contentDetails'] = {'relatedPlaylists': {'likes': '', 'uploads': 'UU' + cid[2:]}}
+        items.append(item)
+    return {'kind': 'youtube#channelListResponse', 'items': items, 'pageInfo': {'totalResults': len(items)}}
+
+def make_playlist_page(pid, n):
+    rnd = random.Random(pid)
+    items = []
+    for k in range(n):
+        vid = f"{pid[-8:]}{k:03d}"
+        items.append({'kind': 'youtube#playlistItem', 'etag': f"etag-{vid}", 'snippet': {
+            'title': f"Upload {vid}", 'channelId': 'UC' + pid[2:], 'channelTitle': f"Channel {pid[-6:]}",
+            'description': 'lorem ipsum ' * rnd.randint(5, 60), 'thumbnails': make_thumbnails(vid),
+            'resourceId': {'kind': 'youtube#video', 'videoId': vid}, 'position': k,
+        }})
+    return {'kind': 'youtube#playlistItemListResponse', 'items': items}
+
+def make_comment_page(vid):
+    rnd = random.Random(vid)
+    if rnd.random() < 0.1: return {'items': []}
+    text = ' '.join(rnd.choice(['so', 'good', 'this', 'is', 'amazing', 'lol']) for _ in range(rnd.randint(3, 60)))
+    return {'kind': 'youtube#commentThreadListResponse', 'items': [
+        {'snippet': {'topLevelComment': {'snippet': {'textDisplay': text, 'likeCount': 10}}}}]}
+
+class SyntheticHttp:
+    # 代替 httplib2.Http: 按请求参数现场生成响应
+    def __init__(self, n_channels, pool_size, seed=0):
+        self.n_channels = n_channels
+        self.pool_size = pool_size
+        self.seed = seed
+
+    def request(self, uri, method='GET', body=None, headers=None, **kwargs):
+        parts = urlsplit(uri)
+        endpoint = parts.path.rsplit('/', 1)[-1]
+        q = dict(parse_qsl(parts.query))
+        if endpoint == 'videos' and q.get('chart'):
+            # 各地区从同一个视频池里抽, 让地区之间有真实的重复
+            rnd = random.Random(f"{self.seed}-{q.get('regionCode')}-{q.get('pageToken')}")
+            ids = rnd.sample(range(self.pool_size), min(int(q.get('maxResults', 5)), self.pool_size))
+            items = [make_video(random.Random(i), f"vid{i:08d}", channel_id(i % max(self.n_channels, 1))) for i in ids]
+            data = {'kind': 'youtube#videoListResponse', 'items': items}
+        elif endpoint == 'videos':
+            data = {'items': [{'id': vid, 'statistics': make_video(random.Random(vid), vid, '')['statistics']}
+                              for vid in q['id'].split(',')]}
+        elif endpoint == 'channels':
+            data = make_channels_page(q['id'].split(','), q.get('part', ''))
+        elif endpoint == 'playlistItems':
+            data = make_playlist_page(q['playlistId'], int(q.get('maxResults', 5)))
+        elif endpoint == 'commentThreads':
+            data = make_comment_page(q['videoId'])
+        else:
+            return httplib2.Response({'status': '404'}), b'{"error": {"code": 404}}'
+        return httplib2.Response({'status': '200', 'content-type': 'application/json'}), json.dumps(data).encode('utf-8')
+
+class EchoTranslator:
+    # 不联网的翻译器, 只测翻译阶段本身的开销
+    def translate(self, text):
+        return text.upper()
+
+# --- 测量 ---
+def reset_caches():
+    with main._db_lock:
+        db = main.get_cache_db()
+        for cache in main._caches: db.execute(f"DELETE FROM {cache.name}")
+        db.commit()
+
+def measure(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        reset_caches()
+        t = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t)
+    # 内存峰值单独跑一次, tracemalloc 本身会拖慢计时
+    reset_caches()
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'seconds_best': min(times), 'seconds_median': statistics.median(times), 'peak_kb': peak // 1024}
+
+def sort_rank(videos, subs_map):
+    # 对照组: 原先的 "分桶 -> 整桶排序 -> 截断", 和 rank 同表输出
+    breakout, music, ent, content = [], [], [], []
+    for v in videos:
+        if not main.is_rankable(v): continue
+        v.viral_ratio = v.view_cnt / subs_map.get(v.channel_id, 10000000)
+        if v.viral_ratio > 3.0 and v.view_cnt > 50000: breakout.append(v)
+        elif v.category == '10': music.append(v)
+        elif v.category == '24': ent.append(v)
+        else: content.append(v)
+    breakout.sort(key=lambda x: x.viral_ratio, reverse=True)
+    for bucket in (music, ent, content): bucket.sort(key=lambda x: x.like_cnt, reverse=True)
+    liked = [music[:7], ent[:5], content[:35]]
+    for bucket in (music, ent, content): bucket.sort(key=lambda x: x.comm_cnt, reverse=True)
+    return breakout[:20], liked, [music[:7], ent[:5], content[:35]]
+
+def use_synthetic_api(n_channels, pool_size):
+    main.new_http = lambda: SyntheticHttp(n_channels, pool_size)
+    main._local.__dict__.clear()
+    return main.build('youtube', 'v3', developerKey='bench', http=main.new_http())
+
+def bench_stages(args):
+    results = []
+
+    def record(stage, size, fn):
+        res = dict(stage=stage, size=size, **measure(fn, args.repeat))
+        results.append(res)
+        print(f"{stage:<16} {json.dumps(size):<32} best {res['seconds_best']*1000:9.1f} ms   "
+              f"median {res['seconds_median']*1000:9.1f} ms   peak {res['peak_kb']:>8} KB")
+
+    for n in args.regions:
+        youtube = use_synthetic_api(args.channels[0], n * 20)
+        regions = {code: main.region_flag(code) for code in region_codes(n)}
+        def scan():
+            main.TARGET_REGIONS = regions
+            main.scan_region_charts(youtube)
+        record('scan', {'regions': n}, scan)
+
+    for n in args.channels:
+        youtube = use_synthetic_api(n, 1000)
+        ids = [channel_id(i) for i in range(n)]
+        record('channel_subs', {'channels': n}, lambda: main.get_channel_subs_batch(youtube, ids))
+        record('channel_videos', {'channels': n}, lambda: main.fetch_channel_videos(youtube, ids))
+
+    for n in args.videos:
+        videos = make_videos(n, args.channels[-1])
+        youtube = use_synthetic_api(args.channels[-1], n)
+        subs_map = main.get_channel_subs_batch(youtube, [v.channel_id for v in videos])
+        breakout, liked_set, discuss_set = main.rank_pool(videos, subs_map)
+        record('rank', {'videos': n}, lambda: main.rank_pool(videos, subs_map))
+        record('rank_sort', {'videos': n}, lambda: sort_rank(videos, subs_map))
+        record('render_cards', {'videos': n}, lambda: main.render_cards(videos, 'breakout'))
+
+        selected = breakout + liked_set['music'] + liked_set['ent'] + liked_set['content']
+        record('comments', {'videos': n}, lambda: main.attach_hot_comments(youtube, selected))
+        def translate(targets=selected + discuss_set['content']):
+            # translate_videos 会跳过已有译文的记录, 每次先清掉上一轮的结果
+            for v in targets: v.title_zh, v.hot_comment, v.translations = None, "", None
+            main.translate_videos(targets)
+        record('translate', {'videos': n}, translate)
+        record('generate_html', {'videos': n},
+               lambda: main.generate_html(breakout, liked_set, discuss_set, selected[:24], selected[-21:]))
+    return results
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except Exception: return None
+
+def parse_sizes(text):
+    return [int(x) for x in text.split(',') if x]
+
+def run():
+    parser = argparse.ArgumentParser(description="VISION 流水线基准测试")
+    parser.add_argument('--regions', type=parse_sizes, default=[10, 50, 100])
+    parser.add_argument('--videos', type=parse_sizes, default=[1000, 10000, 50000])
+    parser.add_argument('--channels', type=parse_sizes, default=[10, 500, 5000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--out', default='bench_results.json')
+    args = parser.parse_args()
+
+    out = os.path.abspath(args.out)
+    commit = git_commit()
+    main.new_translator = lambda target: EchoTranslator()
+    # generate_html 会写 index.html, 放到临时目录里
+    os.chdir(BENCH_DIR)
+    results = bench_stages(args)
+
+    report = {
+        'commit': commit,
+        'python': platform.python_version(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'repeat': args.repeat,
+        'results': results,
+    }
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"结果已写入 {out}")
+
+if __name__ == "__main__":
+    run()
@@ -1,9 +1,34 @@
 import os
+import sys
 import datetime
 import re
 import html
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+import functools
+import tempfile
+import gzip
+import heapq
+import operator
+import random
+import httplib2
+from string import Template
+from contextlib import contextmanager
+from urllib.parse import urlsplit, parse_qsl, urlencode
+from concurrent.futures import ThreadPoolExecutor
 from googleapiclient.discovery import build
+from googleapiclient.http import build_http
+from googleapiclient.errors import HttpError
 from deep_translator import GoogleTranslator
+from deep_translator.exceptions import RequestError, TooManyRequests
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 # --- 1. 配置区域 ---
 API_KEY = os.environ.get("YOUTUBE_API_KEY")
@@ -38,17 +63,701 @@ TARGET_REGIONS = {
     'BR': '🇧🇷', 'AU': '🇦🇺'
 }
 
+# 扫描模式: top 只取上面各地区榜单的前 35 条; full 覆盖 YouTube 支持的全部地区, 翻页取完整榜单
+SCAN_MODE = os.environ.get("SCAN_MODE", "top")
+SCAN_MAX_PAGES = int(os.environ.get("SCAN_MAX_PAGES", 4))
+REGIONS_TTL_DAYS = int(os.environ.get("REGIONS_TTL_DAYS", 30))
+
+# 不参与排名的视频: Shorts (60 秒以内) 和 电影动画 / 游戏 / 新闻政治 分类
+MIN_DURATION_S = 60
+EXCLUDED_CATEGORIES = {'1', '20', '25'}
+
+# API 限流: 每秒请求数 + 单次运行的配额上限 (YouTube 每日配额 10000 单位, list 调用每次 1 单位)
+API_QPS = float(os.environ.get("API_QPS", 20))
+API_QUOTA_BUDGET = int(os.environ.get("API_QUOTA_BUDGET", 5000))
+API_WORKERS = int(os.environ.get("API_WORKERS", 8))
+
+# 运行指标 (各阶段耗时、延迟分位、异常、配额) 写入的文件
+METRICS_FILE = os.environ.get("METRICS_FILE", "metrics.json")
+
+# 输出模式: html = 整页静态渲染 (默认); json = data.json + 按需渲染标签页的壳页面, 并生成 .gz/.br 预压缩文件
+OUTPUT_MODE = os.environ.get("OUTPUT_MODE", "html")
+
+# 翻译目标语言
+TARGET_LANG = 'zh-CN'
+# 多语言版本: 一次抓取和排名, 每种语言各翻译、渲染一份; 主语言仍写 index.html, 其他语言写 index.<lang>.html
+EDITIONS = list(dict.fromkeys([TARGET_LANG] + [l.strip() for l in os.environ.get("EDITIONS", "").split(',') if l.strip()]))
+
+# 离线调试: FIXTURE_MODE=record 把本次所有 API/翻译请求录到 FIXTURE_DIR,
+# FIXTURE_MODE=replay 不联网, 直接回放录好的响应 (可用 FIXTURE_LATENCY_MS 模拟网络延迟)
+FIXTURE_MODE = os.environ.get("FIXTURE_MODE")
+FIXTURE_DIR = os.environ.get("FIXTURE_DIR", "fixtures")
+FIXTURE_LATENCY_MS = float(os.environ.get("FIXTURE_LATENCY_MS", 0))
+
+# 本地持久缓存 (由 workflow 的 actions/cache 在两次运行间保存/恢复)
+# 录制/回放时只用内存缓存, 保证每个请求都真实发生一次
+CACHE_DIR = os.environ.get("CACHE_DIR", ".cache")
+CACHE_DB = ":memory:" if FIXTURE_MODE else os.path.join(CACHE_DIR, "cache.sqlite3")
+TRANSLATE_TTL_DAYS = int(os.environ.get("TRANSLATE_TTL_DAYS", 30))
+TRANSLATE_CACHE_MAX = int(os.environ.get("TRANSLATE_CACHE_MAX", 50000))
+COMMENT_TTL_HOURS = int(os.environ.get("COMMENT_TTL_HOURS", 72))
+COMMENT_CACHE_MAX = int(os.environ.get("COMMENT_CACHE_MAX", 20000))
+SUBS_TTL_HOURS = int(os.environ.get("SUBS_TTL_HOURS", 72))
+HTTP_CACHE_TTL_DAYS = int(os.environ.get("HTTP_CACHE_TTL_DAYS", 7))
+HTTP_CACHE_MAX = int(os.environ.get("HTTP_CACHE_MAX", 5000))
+
+# 快照库: 每次运行的视频/频道数据按日期存档, 下次运行只做增量工作
+SNAPSHOT_DB = ":memory:" if FIXTURE_MODE else os.path.join(CACHE_DIR, "snapshots.sqlite3")
+SNAPSHOT_KEEP_DAYS = int(os.environ.get("SNAPSHOT_KEEP_DAYS", 30))
+# 黑马指标: viral_ratio = 总播放/订阅; velocity = 较上次快照的日均播放增量/订阅 (没有历史的视频按总播放算)
+BREAKOUT_METRIC = os.environ.get("BREAKOUT_METRIC", "viral_ratio")
+
+# 批量翻译: GoogleTranslator 单次请求上限 5000 字符, 留出余量
+TRANSLATE_BATCH_CHARS = 4500
+TRANSLATE_SEP = "\n"
+TRANSLATE_WORKERS = int(os.environ.get("TRANSLATE_WORKERS", 4))
+
+# 运行时限: 整个任务的截止时间, 单次调用超时, 暂时性错误的重试, 连续失败后熔断
+RUN_DEADLINE_S = float(os.environ.get("RUN_DEADLINE_S", 1200))
+API_TIMEOUT_S = float(os.environ.get("API_TIMEOUT_S", 30))
+TRANSLATE_TIMEOUT_S = float(os.environ.get("TRANSLATE_TIMEOUT_S", 20))
+RETRY_MAX = int(os.environ.get("RETRY_MAX", 2))
+RETRY_BASE_S = float(os.environ.get("RETRY_BASE_S", 1))
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+BREAKER_THRESHOLD = int(os.environ.get("BREAKER_THRESHOLD", 5))
+BREAKER_COOLDOWN_S = float(os.environ.get("BREAKER_COOLDOWN_S", 60))
+
 def get_youtube_service():
+    if FIXTURE_MODE == 'replay':
+        return build('youtube', 'v3', developerKey=API_KEY or 'replay', http=new_http())
     if not API_KEY: return None
-    return build('youtube', 'v3', developerKey=API_KEY)
+    return build('youtube', 'v3', developerKey=API_KEY, http=new_http())
 
-# --- 翻译模块 ---
-def translate_text(text):
-    if not text: return ""
+# --- 运行指标 ---
+class Metrics:
+    # 按阶段记录调用次数、耗时、异常类型; 按接口记录配额消耗
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.stages = {}
+        self.quota = {}
+        self.counters = {}
+
+    def _stage(self, stage):
+        return self.stages.setdefault(stage, {'latencies': [], 'errors': {}})
+
+    def record(self, stage, seconds, exc=None):
+        with self.lock:
+            st = self._stage(stage)
+            st['latencies'].append(seconds)
+            if exc is not None: st['errors'][type(exc).__name__] = st['errors'].get(type(exc).__name__, 0) + 1
+
+    def error(self, stage, exc):
+        # 被吞掉 (降级处理) 的异常也要记下来
+        with self.lock:
+            errors = self._stage(stage)['errors']
+            errors[type(exc).__name__] = errors.get(type(exc).__name__, 0) + 1
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def add_quota(self, endpoint, units):
+        with self.lock:
+            self.quota[endpoint] = self.quota.get(endpoint, 0) + units
+
+    def report(self):
+        def pct(values, p):
+            return values[min(len(values) - 1, int(len(values) * p))] if values else 0
+        stages = {}
+        with self.lock:
+            for name, st in sorted(self.stages.items()):
+                lat = sorted(st['latencies'])
+                stages[name] = {
+                    'calls': len(lat), 'total_s': round(sum(lat), 4),
+                    'p50_ms': round(pct(lat, 0.5) * 1000, 2), 'p90_ms': round(pct(lat, 0.9) * 1000, 2),
+                    'p99_ms': round(pct(lat, 0.99) * 1000, 2), 'max_ms': round(pct(lat, 1) * 1000, 2),
+                    'errors': dict(st['errors']),
+                }
+            quota = dict(self.quota)
+            counters = dict(self.counters)
+        return {'wall_s': round(time.time() - self.started, 3), 'stages': stages,
+                'quota_units': quota, 'quota_total': sum(quota.values()), 'counters': counters}
+
+metrics = Metrics()
+
+def instrumented(stage):
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            t = time.perf_counter()
+            exc = None
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                exc = e
+                raise
+            finally:
+                metrics.record(stage, time.perf_counter() - t, exc)
+        return wrapper
+    return decorator
+
+# --- 限流 ---
+class QuotaExceeded(Exception):
+    pass
+
+class RateLimiter:
+    # 令牌桶: 每秒补充 rate 个令牌, 最多攒 burst 个; 同时累计本次运行消耗的配额单位
+    def __init__(self, rate, burst, quota_budget):
+        self.rate = rate
+        self.burst = burst
+        self.quota_budget = quota_budget
+        self.quota_used = 0
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, cost=1):
+        with self.lock:
+            if self.quota_used + cost > self.quota_budget:
+                raise QuotaExceeded(f"本次运行配额已用完 ({self.quota_used}/{self.quota_budget})")
+            self.quota_used += cost
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # 令牌不足时预支, 按欠账时长等待
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait > 0: time.sleep(wait)
+
+api_limiter = RateLimiter(API_QPS, max(API_QPS, 1), API_QUOTA_BUDGET)
+
+# --- 截止时间 / 重试 / 熔断 ---
+class DeadlineExceeded(Exception):
+    pass
+
+class CircuitOpen(Exception):
+    pass
+
+class Deadline:
+    def __init__(self, seconds):
+        self.expires = time.monotonic() + seconds
+
+    def remaining(self):
+        return self.expires - time.monotonic()
+
+    def check(self, stage):
+        if self.remaining() <= 0: raise DeadlineExceeded(f"{stage}: 已超过本次运行的截止时间")
+
+class CircuitBreaker:
+    # 连续失败 threshold 次后熔断: cooldown 秒内直接拒绝调用, 之后放行试探, 试探再失败则继续熔断
+    def __init__(self, name, threshold, cooldown):
+        self.name = name
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.trips = 0
+        self.rejected = 0
+        self.lock = threading.Lock()
+
+    def check(self):
+        with self.lock:
+            if self.opened_at is None: return
+            if time.monotonic() - self.opened_at < self.cooldown:
+                self.rejected += 1
+                raise CircuitOpen(f"{self.name} 已熔断")
+            self.opened_at = None
+
+    def success(self):
+        with self.lock: self.failures = 0
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures >= self.threshold and self.opened_at is None:
+                self.opened_at = time.monotonic()
+                self.trips += 1
+
+    def is_open(self):
+        return self.opened_at is not None
+
+    def stats(self):
+        return {'trips': self.trips, 'rejected': self.rejected, 'open': self.is_open()}
+
+run_deadline = Deadline(RUN_DEADLINE_S)
+translate_breaker = CircuitBreaker('translate', BREAKER_THRESHOLD, BREAKER_COOLDOWN_S)
+# YouTube 按接口分别熔断: 评论接口故障不影响榜单和频道抓取
+_breakers = {'translate': translate_breaker}
+_breakers_lock = threading.Lock()
+
+def api_breaker(endpoint):
+    with _breakers_lock:
+        if endpoint not in _breakers:
+            _breakers[endpoint] = CircuitBreaker(endpoint, BREAKER_THRESHOLD, BREAKER_COOLDOWN_S)
+        return _breakers[endpoint]
+
+def is_transient(exc):
+    # 限流、服务端错误、网络/超时错误可以重试; 404、评论关闭之类重试也没用
+    if isinstance(exc, HttpError): return exc.resp.status in RETRY_STATUSES
+    return isinstance(exc, OSError)
+
+def call_with_timeout(fn, timeout):
+    # 在守护线程里执行, 超时就不再等待; 卡住的线程不会阻止进程退出
+    box = {}
+    def run():
+        try: box['value'] = fn()
+        except BaseException as e: box['error'] = e
+    t = threading.Thread(target=run, daemon=True)
+    t.start()
+    t.join(max(timeout, 0))
+    if t.is_alive(): raise TimeoutError(f"调用超过 {timeout:.1f}s 未返回")
+    if 'error' in box: raise box['error']
+    return box['value']
+
+def call_resilient(stage, breaker, fn, timeout=None, transient=is_transient):
+    # 截止时间 -> 熔断 -> 超时 -> 带抖动的指数退避重试; 最终的异常照常抛出, 由调用方降级处理
+    attempt = 0
+    while True:
+        run_deadline.check(stage)
+        breaker.check()
+        try:
+            out = fn() if timeout is None else call_with_timeout(fn, min(timeout, run_deadline.remaining()))
+        except Exception as e:
+            if not transient(e): raise
+            breaker.failure()
+            delay = RETRY_BASE_S * 2 ** attempt * random.uniform(0.5, 1.5)
+            if attempt >= RETRY_MAX or breaker.is_open() or delay >= run_deadline.remaining(): raise
+            metrics.error(f"retry:{stage}", e)
+            time.sleep(delay)
+            attempt += 1
+            continue
+        breaker.success()
+        return out
+
+_local = threading.local()
+
+def api_endpoint(request):
+    # 如 "youtube.videos.list"
+    return getattr(request, 'methodId', None) or urlsplit(request.uri).path.rsplit('/', 1)[-1]
+
+def api_execute(request, cost=1):
+    # 所有 YouTube 调用都经过这里: 先拿令牌, 再用本线程自己的连接执行 (httplib2 连接不是线程安全的)
+    # 每次重试都重新拿令牌、计配额
+    endpoint = api_endpoint(request)
+    if not hasattr(_local, 'http'): _local.http = new_http()
+    execute = instrumented(f"api:{endpoint}")(request.execute)
+    def attempt():
+        api_limiter.acquire(cost)
+        metrics.add_quota(endpoint, cost)
+        return execute(http=_local.http)
+    return call_resilient(f"api:{endpoint}", api_breaker(endpoint), attempt)
+
+# --- 持久缓存 ---
+_db = None
+_db_lock = threading.Lock()
+_caches = []
+
+def get_cache_db():
+    global _db
+    if _db is None:
+        if CACHE_DB != ":memory:": os.makedirs(CACHE_DIR, exist_ok=True)
+        _db = sqlite3.connect(CACHE_DB, check_same_thread=False)
+    return _db
+
+class DiskCache:
+    # SQLite 键值缓存: 每条记录带写入时间(TTL 过期)和访问时间(超出上限时按 LRU 淘汰)
+    # stale_ttl: 过期记录再保留多久, 供请求失败时 get(stale=True) 兜底
+    def __init__(self, name, ttl, max_entries, stale_ttl=None):
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = max(ttl, stale_ttl or 0)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        _caches.append(self)
+        with _db_lock:
+            get_cache_db().execute(
+                f"CREATE TABLE IF NOT EXISTS {name} "
+                "(k TEXT PRIMARY KEY, v TEXT, created REAL, accessed REAL)"
+            )
+
+    def get(self, key, stale=False):
+        now = time.time()
+        with _db_lock:
+            db = get_cache_db()
+            row = db.execute(f"SELECT v, created FROM {self.name} WHERE k=?", (key,)).fetchone()
+            if row is None or now - row[1] > (self.stale_ttl if stale else self.ttl):
+                if not stale: self.misses += 1
+                return None
+            db.execute(f"UPDATE {self.name} SET accessed=? WHERE k=?", (now, key))
+            if not stale: self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        now = time.time()
+        with _db_lock:
+            get_cache_db().execute(
+                f"INSERT OR REPLACE INTO {self.name} VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now, now)
+            )
+
+    def prune(self):
+        with _db_lock:
+            db = get_cache_db()
+            db.execute(f"DELETE FROM {self.name} WHERE created < ?", (time.time() - self.stale_ttl,))
+            db.execute(
+                f"DELETE FROM {self.name} WHERE k NOT IN "
+                f"(SELECT k FROM {self.name} ORDER BY accessed DESC LIMIT ?)",
+                (self.max_entries,)
+            )
+            db.commit()
+
+    def stats(self):
+        return f"{self.name}: 命中 {self.hits} / 未命中 {self.misses}"
+
+translation_cache = DiskCache('translations', TRANSLATE_TTL_DAYS * 86400, TRANSLATE_CACHE_MAX)
+# 神评论原文按视频 id 缓存, "" 表示没有评论或评论区已关闭
+comment_cache = DiskCache('comments', COMMENT_TTL_HOURS * 3600, COMMENT_CACHE_MAX)
+# 频道 id -> 上传列表 id, 基本不会变
+uploads_cache = DiskCache('uploads_playlists', 90 * 86400, 100000)
+# 频道订阅数, 过期后仍保留一段时间作为请求失败时的兜底
+subs_cache = DiskCache('channel_subs', SUBS_TTL_HOURS * 3600, 100000, stale_ttl=30 * 86400)
+# GET 响应体 + ETag, 用于条件请求
+http_cache = DiskCache('http_etags', HTTP_CACHE_TTL_DAYS * 86400, HTTP_CACHE_MAX)
+# YouTube 支持的地区列表, 很少变化
+regions_cache = DiskCache('regions', REGIONS_TTL_DAYS * 86400, 10, stale_ttl=365 * 86400)
+
+# --- 条件请求 (ETag / If-None-Match) ---
+etag_stats = {}
+_etag_lock = threading.Lock()
+
+def _cache_uri(uri):
+    # 缓存键去掉 API key, 避免把密钥写进缓存文件
+    parts = urlsplit(uri)
+    query = urlencode([(k, v) for k, v in parse_qsl(parts.query) if k != 'key'])
+    return f"{parts.path}?{query}"
+
+class ETagHttp:
+    # 包装 httplib2.Http: GET 响应连同 ETag 存盘, 下次带 If-None-Match 请求, 304 时直接返回本地副本
+    def __init__(self, http):
+        self.http = http
+
+    def __getattr__(self, name):
+        return getattr(self.http, name)
+
+    def request(self, uri, method='GET', body=None, headers=None, **kwargs):
+        if method != 'GET':
+            return self.http.request(uri, method, body=body, headers=headers, **kwargs)
+        key = _cache_uri(uri)
+        cached = http_cache.get(key)
+        headers = dict(headers or {})
+        if cached: headers['If-None-Match'] = cached['etag']
+        resp, content = self.http.request(uri, method, body=body, headers=headers, **kwargs)
+
+        endpoint = urlsplit(uri).path.rsplit('/', 1)[-1]
+        with _etag_lock:
+            stat = etag_stats.setdefault(endpoint, {'requests': 0, 'not_modified': 0, 'bytes_saved': 0, 'quota_saved': 0})
+            stat['requests'] += 1
+            if resp.status == 304 and cached:
+                stat['not_modified'] += 1
+                stat['bytes_saved'] += len(cached['body'].encode('utf-8'))
+                # list 调用每次 1 配额单位
+                stat['quota_saved'] += 1
+        if resp.status == 304 and cached:
+            resp.status = 200
+            resp['status'] = '200'
+            return resp, cached['body'].encode('utf-8')
+        if resp.status == 200:
+            etag = resp.get('etag')
+            if not etag:
+                try: etag = '"%s"' % json.loads(content)['etag']
+                except (ValueError, KeyError, TypeError) as e:
+                    metrics.error('etag', e)
+                    etag = None
+            if etag: http_cache.set(key, {'etag': etag, 'body': content.decode('utf-8')})
+        return resp, content
+
+# --- 录制 / 回放 ---
+def _fixture_path(kind, key):
+    return os.path.join(FIXTURE_DIR, kind, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.json')
+
+def _write_fixture(kind, key, data):
+    path = _fixture_path(kind, key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(dict(data, key=key), f, ensure_ascii=False)
+
+def _read_fixture(kind, key):
+    if FIXTURE_LATENCY_MS: time.sleep(FIXTURE_LATENCY_MS / 1000)
     try:
-        src = text[:400]
-        return GoogleTranslator(source='auto', target='zh-CN').translate(src)
-    except: return text
+        with open(_fixture_path(kind, key), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError: return None
+
+class RecordHttp:
+    # 录制: 照常请求, 响应按 (方法, 去掉 key 的 URI) 存成 fixture
+    def __init__(self, http):
+        self.http = http
+
+    def __getattr__(self, name):
+        return getattr(self.http, name)
+
+    def request(self, uri, method='GET', body=None, headers=None, **kwargs):
+        resp, content = self.http.request(uri, method, body=body, headers=headers, **kwargs)
+        key = f"{method} {_cache_uri(uri)}"
+        _write_fixture('youtube', key, {'status': resp.status, 'body': content.decode('utf-8')})
+        return resp, content
+
+class ReplayHttp:
+    # 回放: 代替 httplib2.Http, 从 fixture 返回响应, 没录到的请求按 404 处理
+    def request(self, uri, method='GET', body=None, headers=None, **kwargs):
+        key = f"{method} {_cache_uri(uri)}"
+        data = _read_fixture('youtube', key)
+        if data is None:
+            data = {'status': 404, 'body': json.dumps({'error': {'code': 404, 'message': f"no fixture: {key}"}})}
+        return httplib2.Response({'status': str(data['status'])}), data['body'].encode('utf-8')
+
+def build_timed_http():
+    # httplib2 的 socket 超时, 防止单个请求卡住
+    http = build_http()
+    http.timeout = API_TIMEOUT_S
+    return http
+
+def new_http():
+    if FIXTURE_MODE == 'replay': return ReplayHttp()
+    if FIXTURE_MODE == 'record': return RecordHttp(build_timed_http())
+    return ETagHttp(build_timed_http())
+
+# --- 翻译模块 ---
+class RecordTranslator:
+    def __init__(self, translator, target):
+        self.translator = translator
+        self.target = target
+
+    def translate(self, text):
+        out = self.translator.translate(text)
+        _write_fixture('translate', f"{self.target}\n{text}", {'text': out})
+        return out
+
+class ReplayTranslator:
+    # 代替 GoogleTranslator, 没录到的文本抛错, 由调用方保留原文
+    def __init__(self, target):
+        self.target = target
+
+    def translate(self, text):
+        data = _read_fixture('translate', f"{self.target}\n{text}")
+        if data is None: raise LookupError(f"no translation fixture: {text[:40]}")
+        return data['text']
+
+def new_translator(target):
+    if FIXTURE_MODE == 'replay': return ReplayTranslator(target)
+    translator = GoogleTranslator(source='auto', target=target)
+    if FIXTURE_MODE == 'record': translator = RecordTranslator(translator, target)
+    return translator
+
+def _translation_key(src, target):
+    return f"{target}:{hashlib.sha1(src.encode('utf-8')).hexdigest()}"
+
+def is_transient_translation(exc):
+    # 网络错误、超时、限流、请求失败才重试并计入熔断; 译不出来的内容 (TranslationNotFound、长度不合法等) 只让这一条回退原文
+    return isinstance(exc, (OSError, RequestError, TooManyRequests))
+
+def _translate_call(target, text):
+    # 翻译器没有超时参数, 由 call_with_timeout 兜底
+    # 每次尝试新建实例: GoogleTranslator.translate 先把文本写进实例属性再发请求, 不能跨线程共用, 超时被放弃的线程也只占着自己的那个
+    return call_resilient('translate_request', translate_breaker, lambda: new_translator(target).translate(text),
+                          TRANSLATE_TIMEOUT_S, transient=is_transient_translation)
+
+@instrumented('translate_request')
+def _translate_chunk(chunk, target):
+    # 多条文本用换行拼成一次请求; 返回行数对不上时逐条回退, 失败的条目返回 None
+    if len(chunk) > 1:
+        try:
+            out = _translate_call(target, TRANSLATE_SEP.join(chunk))
+            parts = out.split(TRANSLATE_SEP) if out else []
+            if len(parts) == len(chunk): return [p.strip() or None for p in parts]
+        except Exception as e: metrics.error('translate_request', e)
+    res = []
+    for src in chunk:
+        try: res.append(_translate_call(target, src) or None)
+        except Exception as e:
+            metrics.error('translate_request', e)
+            res.append(None)
+    return res
+
+@instrumented('translate_batch')
+def translate_batch(texts, target=TARGET_LANG):
+    # 去重 -> 查缓存 -> 按长度上限打包 -> 线程池并发翻译, 返回 {原文: 译文}
+    srcs = {}
+    for text in texts:
+        if text and text not in srcs:
+            srcs[text] = text[:400].replace(TRANSLATE_SEP, ' ')
+    done = {}
+    pending = []
+    for src in dict.fromkeys(srcs.values()):
+        cached = translation_cache.get(_translation_key(src, target))
+        if cached is not None: done[src] = cached
+        else: pending.append(src)
+
+    chunks, chunk, size = [], [], 0
+    for src in pending:
+        if chunk and size + len(src) + 1 > TRANSLATE_BATCH_CHARS:
+            chunks.append(chunk)
+            chunk, size = [], 0
+        chunk.append(src)
+        size += len(src) + 1
+    if chunk: chunks.append(chunk)
+
+    if chunks:
+        with ThreadPoolExecutor(max_workers=TRANSLATE_WORKERS) as pool:
+            for chunk, outs in zip(chunks, pool.map(lambda c: _translate_chunk(c, target), chunks)):
+                for src, out in zip(chunk, outs):
+                    if out is None: continue
+                    translation_cache.set(_translation_key(src, target), out)
+                    done[src] = out
+        print(f"翻译: {len(pending)} 条新文本, {len(chunks)} 次请求")
+    # 翻译失败的保留原文
+    return {text: done.get(src, text) for text, src in srcs.items()}
+
+def translate_videos(videos, target=TARGET_LANG):
+    # 翻译阶段: 收集标题和神评论原文, 批量翻译后写回记录
+    # 已有译文的 (快照里沿用来的) 跳过
+    texts = []
+    for v in videos:
+        title, comment = v.localized(target)
+        if title is None: texts.append(v.title)
+        if v.hot_comment_org and not comment: texts.append(v.hot_comment_org)
+    done = translate_batch(texts, target)
+    for v in videos:
+        title, comment = v.localized(target)
+        if title is None: title = done.get(v.title, v.title)
+        if v.hot_comment_org and not comment: comment = clip_comment(done.get(v.hot_comment_org, v.hot_comment_org))
+        v.set_localized(target, title, comment)
+    return videos
+
+def clip_comment(text):
+    return text[:23] + "..." if len(text) > 25 else text
+
+def translate_editions(videos):
+    # 各语言版本并发翻译, 共用翻译缓存和熔断器; translations 先在主线程建好, 线程里只写各自语言的键
+    if len(EDITIONS) > 1:
+        for v in videos:
+            if v.translations is None: v.translations = {}
+    with ThreadPoolExecutor(max_workers=len(EDITIONS)) as pool:
+        list(pool.map(lambda lang: translate_videos(videos, lang), EDITIONS))
+    return videos
+
+# --- 快照库 ---
+class SnapshotStore:
+    # 按 (视频 id, 运行日期) 存每次运行的记录, 含统计、译文和神评论; 频道订阅数按 (频道 id, 日期) 存
+    def __init__(self, path):
+        if path != ":memory:": os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.reused = 0
+        self.fresh = 0
+        # 本次运行从快照沿用的神评论, 保存时不再写入, 让快照里保留原抓取日期
+        self.carried = set()
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS videos (
+                video_id TEXT, run_date TEXT, channel_id TEXT, title TEXT, title_zh TEXT,
+                hot_comment_org TEXT, hot_comment TEXT, view_cnt INTEGER, like_cnt INTEGER, comm_cnt INTEGER,
+                PRIMARY KEY (video_id, run_date));
+            CREATE TABLE IF NOT EXISTS channel_stats (
+                channel_id TEXT, run_date TEXT, subs INTEGER, PRIMARY KEY (channel_id, run_date));
+        """)
+
+    def save_videos(self, run_date, videos):
+        # 同一天多次写入时合并: 后写的空字段不覆盖已有值
+        # 翻译失败时记录上是原文兜底, 存 NULL, 下次运行重新翻译
+        rows = []
+        with self.lock:
+            for v in videos:
+                org = comment = None
+                if v.hot_comment_org is not None and v.id not in self.carried:
+                    org = v.hot_comment_org
+                    if v.hot_comment != clip_comment(org): comment = v.hot_comment
+                rows.append((v.id, run_date, v.channel_id, v.title, v.title_zh if v.title_zh != v.title else None,
+                             org, comment, v.view_cnt, v.like_cnt, v.comm_cnt))
+            self.db.executemany("""
+                INSERT INTO videos VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (video_id, run_date) DO UPDATE SET
+                    title = excluded.title, view_cnt = excluded.view_cnt,
+                    like_cnt = excluded.like_cnt, comm_cnt = excluded.comm_cnt,
+                    title_zh = COALESCE(excluded.title_zh, title_zh),
+                    hot_comment_org = COALESCE(excluded.hot_comment_org, hot_comment_org),
+                    hot_comment = COALESCE(excluded.hot_comment, hot_comment)
+            """, rows)
+
+    def save_channels(self, run_date, subs_map):
+        with self.lock:
+            self.db.executemany("INSERT OR REPLACE INTO channel_stats VALUES (?, ?, ?)",
+                                [(cid, run_date, subs) for cid, subs in subs_map.items()])
+
+    def _latest(self, ids, run_date, columns, where="", params=(), table="videos", key="video_id"):
+        # 每个视频 (频道) 在 run_date 之前最近一次的快照
+        found = {}
+        ids = list(ids)
+        with self.lock:
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i+500]
+                rows = self.db.execute(
+                    f"SELECT {key}, run_date, {columns} FROM {table} "
+                    f"WHERE run_date < ? AND {key} IN ({','.join('?' * len(chunk))}) {where} "
+                    "ORDER BY run_date", [run_date] + chunk + list(params)
+                ).fetchall()
+                for row in rows: found[row[0]] = row[1:]
+        return found
+
+    def previous_subs(self, channel_ids, run_date):
+        # {频道 id: 上次记录的订阅数}
+        return {cid: row[1] for cid, row in
+                self._latest(channel_ids, run_date, "subs", table="channel_stats", key="channel_id").items()}
+
+    def previous_views(self, ids, run_date):
+        # {视频 id: (上次播放量, 距今天数)}
+        today = datetime.date.fromisoformat(run_date)
+        return {vid: (row[1], max((today - datetime.date.fromisoformat(row[0])).days, 1))
+                for vid, row in self._latest(ids, run_date, "view_cnt").items()}
+
+    def restore(self, videos, run_date, comments=True):
+        # 老视频沿用上次的标题译文; 神评论只沿用 COMMENT_TTL_HOURS 以内抓到的
+        # comments=False 只沿用标题 (品牌/创作者视频不显示神评论, 不能把同一视频在榜单里的评论带过来)
+        # 返回没有可用神评论、需要去抓的视频
+        ids = {v.id for v in videos}
+        titles = self._latest(ids, run_date, "title, title_zh", "AND title_zh IS NOT NULL")
+        hot = {}
+        if comments:
+            cutoff = datetime.date.fromisoformat(run_date) - datetime.timedelta(days=-(-COMMENT_TTL_HOURS // 24))
+            hot = self._latest(ids, run_date, "hot_comment_org, hot_comment",
+                               "AND hot_comment_org IS NOT NULL AND run_date > ?", [cutoff.isoformat()])
+        new = []
+        reused = 0
+        carried = set()
+        for v in videos:
+            title, comment = titles.get(v.id), hot.get(v.id)
+            if title and title[1] == v.title and v.title_zh is None: v.title_zh = title[2]
+            if comment is None: new.append(v)
+            else:
+                v.hot_comment_org, v.hot_comment = comment[1], comment[2] or ""
+                carried.add(v.id)
+            if title or comment: reused += 1
+        # 各抓取分支会并发调用
+        with self.lock:
+            self.carried |= carried
+            self.reused += reused
+            self.fresh += len(videos) - reused
+        return new
+
+    def prune(self, run_date):
+        cutoff = (datetime.date.fromisoformat(run_date) - datetime.timedelta(days=SNAPSHOT_KEEP_DAYS)).isoformat()
+        with self.lock:
+            self.db.execute("DELETE FROM videos WHERE run_date < ?", (cutoff,))
+            self.db.execute("DELETE FROM channel_stats WHERE run_date < ?", (cutoff,))
+            self.db.commit()
+
+snapshots = SnapshotStore(SNAPSHOT_DB)
 
 # --- 辅助功能 ---
 def get_seconds(duration_str):
@@ -59,172 +768,403 @@ def get_seconds(duration_str):
     return int(d['hours'] or 0)*3600 + int(d['minutes'] or 0)*60 + int(d['seconds'] or 0)
 
 def get_beijing_time_str():
+    # 回放时用录制当天的日期, 保证输出可复现
+    if FIXTURE_MODE == 'replay':
+        data = _read_fixture('meta', 'run')
+        if data: return data['date']
     return (datetime.datetime.utcnow() + datetime.timedelta(hours=8)).strftime("%Y-%m-%d")
 
+# --- 视频记录 ---
+class VideoRecord:
+    # 只保留排名和渲染用到的字段; API 原始数据解析成记录后立即丢弃
+    __slots__ = ('id', 'title', 'channel_id', 'channel_title', 'category', 'duration', 'cover',
+                 'view_cnt', 'like_cnt', 'comm_cnt', 'region_flag', 'viral_ratio',
+                 'title_zh', 'hot_comment_org', 'hot_comment', 'translations')
+
+    def __init__(self, id, title, channel_id, channel_title, cover, category='0', duration=0):
+        self.id = id
+        self.title = title
+        self.channel_id = channel_id
+        self.channel_title = channel_title
+        self.cover = cover
+        self.category = category
+        self.duration = duration
+        self.view_cnt = 0
+        self.like_cnt = 0
+        self.comm_cnt = 0
+        self.region_flag = None
+        self.viral_ratio = None
+        self.title_zh = None
+        self.hot_comment_org = None
+        self.hot_comment = ""
+        # 附加语言版本的 {语言: (标题译文, 神评论译文)}, 只在多语言模式下创建
+        self.translations = None
+
+    def localized(self, lang):
+        # 主语言的译文存在 title_zh / hot_comment 上 (快照库沿用这两个字段)
+        if lang == TARGET_LANG: return self.title_zh, self.hot_comment
+        return self.translations.get(lang, (None, "")) if self.translations else (None, "")
+
+    def set_localized(self, lang, title, comment):
+        if lang == TARGET_LANG: self.title_zh, self.hot_comment = title, comment
+        else: self.translations[lang] = (title, comment)
+
+    def set_statistics(self, stats):
+        self.view_cnt = int(stats.get('viewCount', 0))
+        self.like_cnt = int(stats.get('likeCount', 0))
+        self.comm_cnt = int(stats.get('commentCount', 0))
+
+def pick_cover(thumbs):
+    return thumbs.get('maxres', thumbs.get('high', thumbs.get('medium')))['url']
+
+def parse_video_item(item):
+    # videos().list 的条目
+    sn = item['snippet']
+    v = VideoRecord(item['id'], sn['title'], sn['channelId'], sn['channelTitle'], pick_cover(sn['thumbnails']),
+                    sn.get('categoryId', '0'), get_seconds(item['contentDetails'].get('duration', '')))
+    v.set_statistics(item['statistics'])
+    return v
+
+def parse_playlist_item(item):
+    # playlistItems().list 的条目, 统计数据之后再补
+    sn = item['snippet']
+    return VideoRecord(sn['resourceId']['videoId'], sn['title'], sn['channelId'], sn['channelTitle'],
+                       pick_cover(sn['thumbnails']))
+
+def parse_items(items, parse, stage):
+    # 单条解析失败 (已删除/私享视频缺缩略图等) 只跳过这一条
+    for item in items:
+        try: yield parse(item)
+        except Exception as e: metrics.error(stage, e)
+
 # --- 核心逻辑 ---
 
+@instrumented('get_channel_subs_batch')
 def get_channel_subs_batch(youtube, channel_ids):
     subs_map = {}
-    unique_ids = list(set(channel_ids))
-    for i in range(0, len(unique_ids), 50):
+    missing = []
+    for cid in dict.fromkeys(channel_ids):
+        count = subs_cache.get(cid)
+        if count is None: missing.append(cid)
+        else: subs_map[cid] = count
+
+    # 只请求缓存里没有或已过期的频道, 每 50 个一批
+    for i in range(0, len(missing), 50):
         try:
-            res = youtube.channels().list(
-                id=','.join(unique_ids[i:i+50]), 
+            res = api_execute(youtube.channels().list(
+                id=','.join(missing[i:i+50]), 
                 part='statistics'
-            ).execute()
+            ))
             for item in res['items']:
                 count = int(item['statistics'].get('subscriberCount', 1000000))
                 if count == 0: count = 1
                 subs_map[item['id']] = count
-        except: pass
+                subs_cache.set(item['id'], count)
+        except Exception as e: metrics.error('get_channel_subs_batch', e)
+
+    # 请求失败的频道用上次的旧值, 避免落到默认值导致黑马判定失效; 缓存里已清掉的再查快照库
+    failed = []
+    for cid in missing:
+        if cid not in subs_map:
+            count = subs_cache.get(cid, stale=True)
+            if count is None: failed.append(cid)
+            else: subs_map[cid] = count
+    if failed: subs_map.update(snapshots.previous_subs(failed, get_beijing_time_str()))
     return subs_map
 
+@instrumented('attach_hot_comment')
 def attach_hot_comment(youtube, video_item):
-    try:
-        res = youtube.commentThreads().list(
-            part="snippet", videoId=video_item['id'], 
-            order="relevance", maxResults=1, textFormat="plainText"
-        ).execute()
-        if res['items']:
-            raw = res['items'][0]['snippet']['topLevelComment']['snippet']['textDisplay']
-            raw = html.unescape(raw).replace('\n', ' ')
-            zh = translate_text(raw)
-            if len(zh) > 25: zh = zh[:23] + "..."
-            video_item['hot_comment'] = zh
-        else: video_item['hot_comment'] = ""
-    except: video_item['hot_comment'] = ""
+    raw = comment_cache.get(video_item.id)
+    if raw is None:
+        try:
+            res = api_execute(youtube.commentThreads().list(
+                part="snippet", videoId=video_item.id, 
+                order="relevance", maxResults=1, textFormat="plainText"
+            ))
+            raw = ""
+            if res['items']:
+                raw = res['items'][0]['snippet']['topLevelComment']['snippet']['textDisplay']
+                raw = html.unescape(raw).replace('\n', ' ')
+            comment_cache.set(video_item.id, raw)
+        except HttpError as e:
+            # 评论区关闭也记入缓存, 之后不再请求
+            if b'commentsDisabled' in (e.content or b''): comment_cache.set(video_item.id, "")
+            else: metrics.error('attach_hot_comment', e)
+            raw = ""
+        except Exception as e:
+            metrics.error('attach_hot_comment', e)
+            raw = ""
+    if raw: video_item.hot_comment_org = raw
+    else: video_item.hot_comment = ""
     return video_item
 
-def fetch_categorized_global_pool(youtube):
-    print("正在进行全球分层扫描...")
+def attach_hot_comments(youtube, videos):
+    targets = list({v.id: v for v in videos}.values())
+    with ThreadPoolExecutor(max_workers=API_WORKERS) as pool:
+        list(pool.map(lambda v: attach_hot_comment(youtube, v), targets))
+    return targets
+
+def region_flag(code):
+    # 两个字母的地区码对应两个区域指示符, 拼起来就是国旗 emoji
+    return ''.join(chr(0x1F1E6 + ord(c) - ord('A')) for c in code.upper())
+
+def get_scan_regions(youtube):
+    if SCAN_MODE != 'full': return TARGET_REGIONS
+    codes = regions_cache.get('i18nRegions')
+    if codes is None:
+        try:
+            res = api_execute(youtube.i18nRegions().list(part='snippet'))
+            codes = sorted(item['snippet']['gl'] for item in res['items'])
+            regions_cache.set('i18nRegions', codes)
+        except Exception as e:
+            metrics.error('get_scan_regions', e)
+            codes = regions_cache.get('i18nRegions', stale=True) or []
+    # 原有地区排在前面, 重复视频的地区标保持不变
+    regions = dict(TARGET_REGIONS)
+    for code in codes: regions.setdefault(code, region_flag(code))
+    return regions
+
+def is_rankable(v):
+    return v.duration >= MIN_DURATION_S and v.category not in EXCLUDED_CATEGORIES
+
+def iter_region_chart(youtube, code):
+    # 逐页请求, 逐条解析, 原始 JSON 随页丢弃
+    page_token = None
+    for _ in range(SCAN_MAX_PAGES if SCAN_MODE == 'full' else 1):
+        res = api_execute(youtube.videos().list(
+            chart='mostPopular', regionCode=code, part='snippet,statistics,contentDetails',
+            maxResults=50 if SCAN_MODE == 'full' else 35, pageToken=page_token
+        ))
+        yield from parse_items(res['items'], parse_video_item, 'fetch_region_chart')
+        page_token = res.get('nextPageToken')
+        if not page_token: break
+
+def fetch_region_chart(youtube, code):
+    # 每条到达时就过滤, 返回 (可参与排名的视频, 被过滤掉的视频 id); 被过滤的只留 id 用于统计
+    videos, skipped = [], []
+    try:
+        for v in iter_region_chart(youtube, code):
+            if is_rankable(v): videos.append(v)
+            else: skipped.append(v.id)
+    except Exception as e:
+        # 后面的页失败时保留已取到的部分
+        if not videos and not skipped: raise
+        metrics.error('fetch_region_chart', e)
+    return videos, skipped
+
+# --- 排名引擎 ---
+# 打分规则: 输入 RankTable, 返回整列分数; 可按需增加新规则
+SCORERS = {
+    'viral_ratio': lambda t: list(map(operator.truediv, t.views, t.subs)),
+    'likes': lambda t: t.likes,
+    'comments': lambda t: t.comments,
+    'engagement': lambda t: [(l + c) / (v or 1) for l, c, v in zip(t.likes, t.comments, t.views)],
+    'velocity': lambda t: list(map(operator.truediv, t.gains, t.subs)),
+}
+
+# 同分时的次级排序: 讨论榜原先是在点赞排序的结果上再按评论数稳定排序, 评论数相同的按点赞数排
+TIEBREAKERS = {'comments': 'likes'}
+
+BUCKET_BREAKOUT, BUCKET_MUSIC, BUCKET_ENT, BUCKET_CONTENT = range(4)
+
+# 榜单: (名称, 分桶, 打分规则, 取前 k 个)
+RANK_QUERIES = [
+    ('breakout', BUCKET_BREAKOUT, 'viral_ratio', 20),
+    ('liked_music', BUCKET_MUSIC, 'likes', 7),
+    ('liked_ent', BUCKET_ENT, 'likes', 5),
+    ('liked_content', BUCKET_CONTENT, 'likes', 35),
+    ('discuss_music', BUCKET_MUSIC, 'comments', 7),
+    ('discuss_ent', BUCKET_ENT, 'comments', 5),
+    ('discuss_content', BUCKET_CONTENT, 'comments', 35),
+]
+
+class RankTable:
+    # 列式存储候选视频的指标; 行号按桶分组, 只算用到的列, 每个榜单只在自己的桶里选 top-k
+    def __init__(self, rows, buckets, subs, gains=None):
+        # buckets: {分桶: [行号]}; gains: 日均播放增量, 没有历史数据时等于总播放
+        self.rows = rows
+        self.buckets = buckets
+        self.subs = subs
+        if gains is not None: self.gains = gains
+
+    @functools.cached_property
+    def views(self): return [v.view_cnt for v in self.rows]
+
+    @functools.cached_property
+    def likes(self): return [v.like_cnt for v in self.rows]
+
+    @functools.cached_property
+    def comments(self): return [v.comm_cnt for v in self.rows]
+
+    @functools.cached_property
+    def gains(self): return self.views
+
+    def top_k(self, queries):
+        scorers = {q[2] for q in queries}
+        scorers |= {TIEBREAKERS[s] for s in scorers if s in TIEBREAKERS}
+        columns = {name: SCORERS[name](self) for name in scorers}
+        top = {}
+        for name, bucket, scorer, k in queries:
+            idx, col, tie = self.buckets[bucket], columns[scorer], TIEBREAKERS.get(scorer)
+            if tie:
+                # 次级分数是非负整数, 合成一个整数键, 比较结果与 (分数, 次级分数) 相同; 只算本桶的行
+                tie = columns[tie]
+                scale = max(map(tie.__getitem__, idx), default=0) + 1
+                key = {i: col[i] * scale + tie[i] for i in idx}.__getitem__
+            else:
+                key = col.__getitem__
+            # nlargest 同分时保留先出现的行, 结果与原先的稳定排序后截断一致
+            top[name] = [self.rows[i] for i in heapq.nlargest(k, idx, key=key)]
+        return top
+
+def rank_pool(raw_videos, subs_map, prev_views=None):
+    # 过滤 + 分桶 (桶里存行号), 指标写入 RankTable; prev_views 来自快照库, 用于 velocity 指标
+    rows = [v for v in raw_videos if is_rankable(v)]
+    subs_col = [subs_map.get(v.channel_id, 10000000) for v in rows]
+    gains = None
+    if prev_views:
+        gains = [v.view_cnt for v in rows]
+        for i, v in enumerate(rows):
+            if v.id in prev_views:
+                views, days = prev_views[v.id]
+                gains[i] = max(v.view_cnt - views, 0) / days
+    scores = gains if BREAKOUT_METRIC == 'velocity' else None
+    buckets = {b: [] for b in (BUCKET_BREAKOUT, BUCKET_MUSIC, BUCKET_ENT, BUCKET_CONTENT)}
+    for i, v in enumerate(rows):
+        v.viral_ratio = (v.view_cnt if scores is None else scores[i]) / subs_col[i]
+        
+        # 黑马判定
+        if v.viral_ratio > 3.0 and v.view_cnt > 50000: buckets[BUCKET_BREAKOUT].append(i)
+        elif v.category == '10': buckets[BUCKET_MUSIC].append(i)
+        elif v.category == '24': buckets[BUCKET_ENT].append(i)
+        else: buckets[BUCKET_CONTENT].append(i)
+    table = RankTable(rows, buckets, subs_col, gains)
+
+    # 各榜单 top-k
+    queries = [(name, bucket, BREAKOUT_METRIC if name == 'breakout' else scorer, k)
+               for name, bucket, scorer, k in RANK_QUERIES]
+    top = table.top_k(queries)
+    liked_set = {'music': top['liked_music'], 'ent': top['liked_ent'], 'content': top['liked_content']}
+    discuss_set = {'music': top['discuss_music'], 'ent': top['discuss_ent'], 'content': top['discuss_content']}
+    return top['breakout'], liked_set, discuss_set
+
+def scan_region_charts(youtube):
+    # 各地区并发请求 (榜单已在翻页时过滤), 按地区顺序合并, 保证去重和地区标与串行时一致
+    # 返回 (候选视频, 过滤前去重后的视频数)
     raw_videos = []
     seen_ids = set()
-    
+    skipped_ids = set()
+    regions = get_scan_regions(youtube)
+    with ThreadPoolExecutor(max_workers=API_WORKERS) as pool:
+        futures = [(flag, pool.submit(fetch_region_chart, youtube, code)) for code, flag in regions.items()]
+        for flag, fut in futures:
+            try: items, skipped = fut.result()
+            except Exception as e:
+                metrics.error('scan_region_charts', e)
+                continue
+            skipped_ids.update(skipped)
+            for v in items:
+                if v.id not in seen_ids:
+                    v.region_flag = flag
+                    raw_videos.append(v)
+                    seen_ids.add(v.id)
+    total = len(seen_ids | skipped_ids)
+    metrics.count('chart_videos', total)
+    metrics.count('chart_rankable', len(raw_videos))
+    print(f"扫描 {len(regions)} 个地区, 候选 {total} 条, 过滤后 {len(raw_videos)} 条")
+    return raw_videos, total
+
+@instrumented('fetch_categorized_global_pool')
+def fetch_categorized_global_pool(youtube):
+    print("正在进行全球分层扫描...")
+    run_date = get_beijing_time_str()
     # 1. 抓取
-    for code, flag in TARGET_REGIONS.items():
-        try:
-            res = youtube.videos().list(
-                chart='mostPopular', regionCode=code,
-                part='snippet,statistics,contentDetails', maxResults=35
-            ).execute()
-            for item in res['items']:
-                if item['id'] not in seen_ids:
-                    item['region_flag'] = flag
-                    org = item['snippet']['title']
-                    zh = translate_text(org)
-                    item['title_dual'] = {'zh': zh, 'org': org}
-                    raw_videos.append(item)
-                    seen_ids.add(item['id'])
-        except: pass
+    raw_videos, total = scan_region_charts(youtube)
+    snapshots.save_videos(run_date, raw_videos)
 
     # 2. 准备黑马计算
     print("正在计算黑马指数...")
-    all_channel_ids = [v['snippet']['channelId'] for v in raw_videos]
+    all_channel_ids = [v.channel_id for v in raw_videos]
     subs_map = get_channel_subs_batch(youtube, all_channel_ids)
+    snapshots.save_channels(run_date, subs_map)
+    prev_views = snapshots.previous_views([v.id for v in raw_videos], run_date)
 
-    # 3. 分桶
-    bucket_breakout = []
-    bucket_music = []
-    bucket_ent = []
-    bucket_content = []
-    
-    for v in raw_videos:
-        if get_seconds(v['contentDetails'].get('duration', '')) < 60: continue
-        cat = v['snippet'].get('categoryId', '0')
-        if cat in ['1', '20', '25']: continue
-        
-        v['like_cnt'] = int(v['statistics'].get('likeCount', 0))
-        v['view_cnt'] = int(v['statistics'].get('viewCount', 0))
-        v['comm_cnt'] = int(v['statistics'].get('commentCount', 0))
-        cid = v['snippet']['channelId']
-        subs = subs_map.get(cid, 10000000)
-        
-        viral_ratio = v['view_cnt'] / subs
-        v['viral_ratio'] = viral_ratio
-        
-        thumbs = v['snippet']['thumbnails']
-        v['cover'] = thumbs.get('maxres', thumbs.get('high', thumbs.get('medium')))['url']
-        
-        # 黑马判定
-        if viral_ratio > 3.0 and v['view_cnt'] > 50000:
-            bucket_breakout.append(v)
-        elif cat == '10': bucket_music.append(v)
-        elif cat == '24': bucket_ent.append(v)
-        else: bucket_content.append(v)
-
-    # 4. 排序
-    bucket_breakout.sort(key=lambda x: x['viral_ratio'], reverse=True)
-    
-    bucket_music.sort(key=lambda x: x['like_cnt'], reverse=True)
-    bucket_ent.sort(key=lambda x: x['like_cnt'], reverse=True)
-    bucket_content.sort(key=lambda x: x['like_cnt'], reverse=True)
-    
-    liked_set = {
-        'music': bucket_music[:7],
-        'ent': bucket_ent[:5],
-        'content': bucket_content[:35]
-    }
-
-    bucket_music.sort(key=lambda x: x['comm_cnt'], reverse=True)
-    bucket_ent.sort(key=lambda x: x['comm_cnt'], reverse=True)
-    bucket_content.sort(key=lambda x: x['comm_cnt'], reverse=True)
-
-    discuss_set = {
-        'music': bucket_music[:7],
-        'ent': bucket_ent[:5],
-        'content': bucket_content[:35]
-    }
-    
-    # 5. 获取神评论
+    # 3. 分桶 + 排序
+    final_breakout, liked_set, discuss_set = rank_pool(raw_videos, subs_map, prev_views)
+
+    # 4. 获取神评论 (快照里已有的老视频沿用上次结果, 只处理新视频)
     print("正在获取神评论...")
-    final_breakout = bucket_breakout[:20] 
     all_selected = final_breakout + liked_set['music'] + liked_set['ent'] + liked_set['content']
-    seen_vids = set()
-    for v in all_selected:
-        if v['id'] not in seen_vids:
-            attach_hot_comment(youtube, v)
-            seen_vids.add(v['id'])
+    seen_vids = {v.id for v in all_selected}
+    targets = list({v.id: v for v in all_selected + discuss_set['content']}.values())
+    attach_hot_comments(youtube, [v for v in snapshots.restore(targets, run_date) if v.id in seen_vids])
+
+    # 翻译推迟到渲染前, 只翻译页面上出现的视频; 原先每条扫到的视频都要翻译标题
+    shown = len(rendered_videos(page_tabs(final_breakout, liked_set, discuss_set, [], [])))
+    metrics.count('titles_translation_skipped', total - shown)
+    print(f"延迟翻译: 候选 {total} 条, 上榜 {shown} 条, 省去 {total - shown} 次标题翻译")
         
     return final_breakout, liked_set, discuss_set
 
+def resolve_uploads_playlist(youtube, channel_id, refresh=False):
+    # 频道 "UCxxxx" 的上传列表就是 "UUxxxx", 直接推导; 推导不了或推导结果失效时才查 channels().list
+    if not refresh:
+        pid = uploads_cache.get(channel_id)
+        if pid: return pid
+    if channel_id.startswith('UC') and not refresh:
+        pid = 'UU' + channel_id[2:]
+    else:
+        res = api_execute(youtube.channels().list(id=channel_id, part='contentDetails'))
+        pid = res['items'][0]['contentDetails']['relatedPlaylists']['uploads']
+    uploads_cache.set(channel_id, pid)
+    return pid
+
+def fetch_uploads(youtube, channel_id):
+    def list_items(pid):
+        return api_execute(youtube.playlistItems().list(playlistId=pid, part='snippet', maxResults=3))['items']
+    try:
+        return list_items(resolve_uploads_playlist(youtube, channel_id))
+    except HttpError as e:
+        if e.resp.status != 404: raise
+        return list_items(resolve_uploads_playlist(youtube, channel_id, refresh=True))
+
+@instrumented('fetch_channel_videos')
 def fetch_channel_videos(youtube, channel_ids):
     videos = []
-    for i in range(0, len(channel_ids), 50):
-        try:
-            res = youtube.channels().list(id=','.join(channel_ids[i:i+50]), part='contentDetails').execute()
-            for item in res['items']:
-                uid = item['contentDetails']['relatedPlaylists']['uploads']
-                pl = youtube.playlistItems().list(playlistId=uid, part='snippet', maxResults=3).execute()
-                for vid in pl['items']:
-                    v_data = {'id': vid['snippet']['resourceId']['videoId'], 'snippet': vid['snippet']}
-                    thumbs = vid['snippet']['thumbnails']
-                    v_data['cover'] = thumbs.get('maxres', thumbs.get('high', thumbs.get('medium')))['url']
-                    
-                    org = vid['snippet']['title']
-                    zh = translate_text(org)
-                    v_data['title_dual'] = {'zh': zh, 'org': org}
-                    videos.append(v_data)
-        except: pass
-        
+    with ThreadPoolExecutor(max_workers=API_WORKERS) as pool:
+        # 1. 各频道的上传列表并发抓取, 按名单顺序合并
+        futures = [pool.submit(fetch_uploads, youtube, cid) for cid in channel_ids]
+        for fut in futures:
+            try: items = fut.result()
+            except Exception as e:
+                metrics.error('fetch_channel_videos', e)
+                continue
+            videos.extend(parse_items(items, parse_playlist_item, 'fetch_channel_videos'))
+
+        # 2. 统计数据按视频 id 关联, 某条缺失不会影响其他视频
+        vids = [v.id for v in videos]
+        batches = [vids[i:i+50] for i in range(0, len(vids), 50)]
+        futures = [pool.submit(lambda b: api_execute(youtube.videos().list(id=','.join(b), part='statistics')), b) for b in batches]
+        stats_map = {}
+        for fut in futures:
+            try: items = fut.result()['items']
+            except Exception as e:
+                metrics.error('fetch_channel_videos', e)
+                continue
+            for s in items: stats_map[s['id']] = s['statistics']
+
     final_videos = []
-    vids = [v['id'] for v in videos]
-    for i in range(0, len(vids), 50):
-        try:
-            stats = youtube.videos().list(id=','.join(vids[i:i+50]), part='statistics').execute()
-            for j, s in enumerate(stats['items']):
-                if j < len(videos[i:i+50]):
-                    v = videos[i+j]
-                    if v['id'] == s['id']:
-                        v['statistics'] = s['statistics']
-                        final_videos.append(v)
-        except: pass
+    for v in videos:
+        if v.id in stats_map:
+            v.set_statistics(stats_map[v.id])
+            final_videos.append(v)
+    # 老视频只刷新统计数据, 标题译文沿用快照
+    snapshots.restore(final_videos, get_beijing_time_str(), comments=False)
     return final_videos
 
 # --- 网页生成 (高级灰 + 吸顶导航) ---
-def generate_html(breakout, liked_set, discuss_set, brands, creators):
-    today_str = get_beijing_time_str()
-    
-    html = f"""
+# 模板在导入时编译一次; 渲染时逐块写入临时文件, 完成后原子替换 index.html
+PAGE_HEAD = Template("""
     <!DOCTYPE html>
     <html lang="en">
     <head>
@@ -233,28 +1173,28 @@ def generate_html(breakout, liked_set, discuss_set, brands, creators):
         <title>VISION | Design Edition</title>
         <style>
             /* 1. 配色方案：高级灰 (Ref: Awwwards) */
-            :root {{ 
+            :root { 
                 --bg: #F2F2F2; 
                 --text: #111; 
                 --card-bg: #fff;
                 --accent: #000;
                 --shadow: 0 10px 30px rgba(0,0,0,0.06);
-            }}
+            }
             
-            body {{ 
+            body { 
                 background: var(--bg); 
                 color: var(--text); 
                 font-family: 'Helvetica Neue', Helvetica, Arial, sans-serif; 
                 margin: 0; 
                 padding-bottom: 100px; 
-            }}
+            }
             
             /* 2. 头部：超大字体 (Ref: OBYS) */
-            header {{ 
+            header { 
                 padding: 100px 20px 60px; 
                 text-align: center; 
-            }}
-            h1 {{ 
+            }
+            h1 { 
                 margin: 0; 
                 font-size: 10vw; 
                 font-weight: 900; 
@@ -262,18 +1202,18 @@ def generate_html(breakout, liked_set, discuss_set, brands, creators):
                 line-height: 0.85;
                 text-transform: uppercase;
                 color: var(--text);
-            }}
-            .date {{ 
+            }
+            .date { 
                 font-size: 1rem; 
                 font-weight: 600;
                 margin-top: 20px; 
                 letter-spacing: 2px; 
                 text-transform: uppercase; 
                 color: #666;
-            }}
+            }
             
             /* 3. 吸顶导航栏 (Sticky + Gallery Style) */
-            .nav-container {{
+            .nav-container {
                 position: sticky;
                 top: 0;
                 z-index: 999;
@@ -285,9 +1225,9 @@ def generate_html(breakout, liked_set, discuss_set, brands, creators):
                 justify-content: center;
                 gap: 15px;
                 overflow-x: auto;
-            }}
+            }
             
-            .btn {{ 
+            .btn { 
                 background: #fff; 
                 border: 1px solid #ddd; 
                 color: #666; 
@@ -300,41 +1240,41 @@ def generate_html(breakout, liked_set, discuss_set, brands, creators):
                 transition: 0.3s; 
                 text-transform: uppercase;
                 white-space: nowrap;
-            }}
-            .btn:hover {{ 
+            }
+            .btn:hover { 
                 background: #000; 
                 color: #fff; 
                 border-color: #000;
                 transform: translateY(-2px);
-            }}
+            }
             
             /* 选中状态 */
-            .btn.active {{ 
+            .btn.active { 
                 background: #000; 
                 color: #fff; 
                 border-color: #000;
-            }}
+            }
             
             /* 黑马榜按钮特殊样式 */
-            .btn-breakout {{ font-weight: 900; letter-spacing: 0.5px; }}
+            .btn-breakout { font-weight: 900; letter-spacing: 0.5px; }
 
-            .container {{ max-width: 1600px; margin: 0 auto; padding: 40px 20px; min-height: 80vh; }}
-            .tab {{ display: none; animation: fade 0.5s; }}
-            .tab.active {{ display: block; }}
-            @keyframes fade {{ from {{opacity:0; transform:translateY(15px);}} to {{opacity:1; transform:translateY(0);}} }}
+            .container { max-width: 1600px; margin: 0 auto; padding: 40px 20px; min-height: 80vh; }
+            .tab { display: none; animation: fade 0.5s; }
+            .tab.active { display: block; }
+            @keyframes fade { from {opacity:0; transform:translateY(15px);} to {opacity:1; transform:translateY(0);} }
             
             /* 分区标题 (黑色加粗) */
-            .section-title {{ 
+            .section-title { 
                 display: flex; align-items: center; margin: 60px 0 30px; 
                 font-size: 2rem; font-weight: 900; color: #000;
                 letter-spacing: -1px;
-            }}
-            .section-title::before {{ content: ''; width: 8px; height: 32px; background: #000; margin-right: 15px; }}
+            }
+            .section-title::before { content: ''; width: 8px; height: 32px; background: #000; margin-right: 15px; }
             
-            .grid {{ display: grid; grid-template-columns: repeat(auto-fill, minmax(320px, 1fr)); gap: 40px 30px; }}
+            .grid { display: grid; grid-template-columns: repeat(auto-fill, minmax(320px, 1fr)); gap: 40px 30px; }
             
             /* 4. 卡片设计：白卡片 + 悬浮徽章 */
-            .card {{ 
+            .card { 
                 position: relative; 
                 border-radius: 16px; 
                 overflow: hidden; 
@@ -342,23 +1282,23 @@ def generate_html(breakout, liked_set, discuss_set, brands, creators):
                 transition: transform 0.3s ease; 
                 box-shadow: var(--shadow);
                 display: flex; flex-direction: column;
-            }}
-            .card:hover {{ transform: translateY(-8px); box-shadow: 0 20px 40px rgba(0,0,0,0.1); }}
+            }
+            .card:hover { transform: translateY(-8px); box-shadow: 0 20px 40px rgba(0,0,0,0.1); }
             
-            .cover-wrap {{ 
+            .cover-wrap { 
                 position: relative; 
                 padding-bottom: 56.25%; 
                 cursor: pointer; 
                 overflow: hidden;
-            }}
-            .cover-wrap img {{ 
+            }
+            .cover-wrap img { 
                 position: absolute; top:0; left:0; width:100%; height:100%; 
                 object-fit: cover; 
                 transition: transform 0.5s; 
-            }}
-            .card:hover .cover-wrap img {{ transform: scale(1.05); }}
+            }
+            .card:hover .cover-wrap img { transform: scale(1.05); }
             
-            .play-btn {{ 
+            .play-btn { 
                 position: absolute; top: 50%; left: 50%; transform: translate(-50%, -50%) scale(0.8); 
                 width: 60px; height: 60px; 
                 background: rgba(255,255,255,0.8); 
@@ -366,43 +1306,43 @@ def generate_html(breakout, liked_set, discuss_set, brands, creators):
                 display: flex; align-items: center; justify-content: center; 
                 opacity: 0; transition: all 0.3s;
                 box-shadow: 0 10px 20px rgba(0,0,0,0.2);
-            }}
-            .play-btn::after {{ content: ''; border: 10px solid transparent; border-left: 16px solid #000; margin-left: 6px; }}
-            .card:hover .play-btn {{ opacity: 1; transform: translate(-50%, -50%) scale(1); }}
+            }
+            .play-btn::after { content: ''; border: 10px solid transparent; border-left: 16px solid #000; margin-left: 6px; }
+            .card:hover .play-btn { opacity: 1; transform: translate(-50%, -50%) scale(1); }
 
             /* 悬浮徽章 */
-            .badge-top-right {{ 
+            .badge-top-right { 
                 position: absolute; top: 15px; right: 15px; 
                 display: flex; flex-direction: column; gap: 8px; align-items: flex-end;
                 z-index: 5;
-            }}
-            .badge-item {{ 
+            }
+            .badge-item { 
                 background: rgba(255,255,255,0.95); 
                 padding: 6px 12px; border-radius: 20px; 
                 font-size: 0.75rem; color: #000; 
                 box-shadow: 0 4px 10px rgba(0,0,0,0.1);
                 font-weight: 700; 
                 display: flex; align-items: center; gap: 5px; 
-            }}
+            }
             
-            .info {{ padding: 25px; display: flex; flex-direction: column; flex-grow: 1; }}
-            .title-zh {{ font-weight: 800; font-size: 1.1rem; color: #000; margin-bottom: 6px; line-height: 1.3; }}
-            .title-org {{ font-size: 0.85rem; color: #888; white-space: nowrap; overflow: hidden; text-overflow: ellipsis; margin-bottom: 15px; }}
+            .info { padding: 25px; display: flex; flex-direction: column; flex-grow: 1; }
+            .title-zh { font-weight: 800; font-size: 1.1rem; color: #000; margin-bottom: 6px; line-height: 1.3; }
+            .title-org { font-size: 0.85rem; color: #888; white-space: nowrap; overflow: hidden; text-overflow: ellipsis; margin-bottom: 15px; }
             
-            .meta-row {{ 
+            .meta-row { 
                 margin-top: auto; 
                 display: flex; justify-content: space-between; align-items: center; 
                 border-top: 1px solid #f0f0f0; padding-top: 15px;
                 font-size: 0.8rem; color: #666; font-weight: 600;
-            }}
-            .channel-name {{ display: flex; align-items: center; gap: 6px; }}
-            .channel-name::before {{ content:''; width:8px; height:8px; background:#000; border-radius:50%; }}
+            }
+            .channel-name { display: flex; align-items: center; gap: 6px; }
+            .channel-name::before { content:''; width:8px; height:8px; background:#000; border-radius:50%; }
             
-            .comment {{ 
+            .comment { 
                 font-size: 0.85rem; color: #555; background: #f9f9f9; 
                 padding: 12px; border-radius: 8px; line-height: 1.5; 
                 font-style: italic; margin-top: 15px;
-            }}
+            }
 
         </style>
     </head>
@@ -410,7 +1350,7 @@ def generate_html(breakout, liked_set, discuss_set, brands, creators):
         <!-- 头部 -->
         <header>
             <h1>VISION<br>DAILY</h1>
-            <div class="date">{today_str} • DESIGN EDITION</div>
+            <div class="date">$today • DESIGN EDITION</div>
         </header>
         
         <!-- 吸顶导航 -->
@@ -423,116 +1363,340 @@ def generate_html(breakout, liked_set, discuss_set, brands, creators):
         </nav>
 
         <div class="container">
-            <!-- 1. Breakout Hits (黑马) -->
-            <div id="breakout" class="tab active">
-                <div class="section-title">🚀 Viral & Trending</div>
-                <div class="grid">{render_cards(breakout, 'breakout')}</div>
-            </div>
+""")
 
-            <!-- 2. Liked (分层) -->
-            <div id="liked" class="tab">
-                <div class="section-title">🎵 Music</div>
-                <div class="grid">{render_cards(liked_set['music'], 'music')}</div>
-                <div class="section-title">🎪 Entertainment</div>
-                <div class="grid">{render_cards(liked_set['ent'], 'ent')}</div>
-                <div class="section-title">💡 Deep Dive</div>
-                <div class="grid">{render_cards(liked_set['content'], 'content')}</div>
-            </div>
-
-            <!-- 3. Discussed (分层) -->
-            <div id="discussed" class="tab">
-                <div class="section-title">💬 Hot Discussions</div>
-                <div class="grid">{render_cards(discuss_set['content'], 'content')}</div>
-            </div>
-
-            <!-- 4. Brands -->
-            <div id="brands" class="tab">
-                <div class="section-title">💎 Brand Zone</div>
-                <div class="grid">{render_cards(brands, 'brand')}</div>
-            </div>
-            
-            <!-- 5. Creators -->
-            <div id="creators" class="tab">
-                <div class="section-title">🎨 Creator Zone</div>
-                <div class="grid">{render_cards(creators, 'creator')}</div>
-            </div>
-        </div>
-
-        <script>
-            function show(id, btn) {{
+# 两种页面共用的标签切换 / 播放脚本; on_show 是切换标签后追加执行的语句
+TAB_SCRIPT = Template("""            function show(id, btn) {
                 document.querySelectorAll('.tab').forEach(t => t.classList.remove('active'));
                 document.querySelectorAll('.btn').forEach(b => b.classList.remove('active'));
                 
                 document.getElementById(id).classList.add('active');
                 btn.classList.add('active');
-                
-                window.scrollTo({{ top: 200, behavior: 'smooth' }});
-            }}
-            function play(wrap, id) {{
+$on_show                
+                window.scrollTo({ top: 200, behavior: 'smooth' });
+            }
+            function play(wrap, id) {
                 wrap.innerHTML = '<iframe src="https://www.youtube.com/embed/'+id+'?autoplay=1" allow="autoplay; fullscreen" style="position:absolute;top:0;left:0;width:100%;height:100%;border:0;"></iframe>';
-            }}
-        </script>
+            }
+""")
+
+# 关闭 .container, 之后是脚本
+PAGE_TAIL = """        </div>
+
+        <script>
+""" + TAB_SCRIPT.substitute(on_show="") + """        </script>
     </body>
     </html>
-    """
-    with open("index.html", "w", encoding="utf-8") as f:
-        f.write(html)
+"""
 
-def render_cards(videos, type):
-    if not videos: return "<p style='color:#666'>Searching...</p>"
-    html = ""
-    for v in videos:
-        badges = ""
-        # 1. 地区标
-        if 'region_flag' in v: badges += f"<div class='badge-item'>{v['region_flag']} Region</div>"
-        # 2. 评论标
-        if v.get('hot_comment'): badges += f"<div class='badge-item'>💬 Hot</div>"
-        # 3. 黑马标
-        if type == 'breakout' and 'viral_ratio' in v:
-             badges += f"<div class='badge-item' style='color:#d35400'>⚡ {round(v['viral_ratio'], 1)}x Viral</div>"
+# json 模式的壳页面脚本: 加载 data.json, 只渲染当前显示的标签页
+SHELL_TAIL = """        </div>
 
-        # 评论文字
-        comm = f"<div class='comment'>“ {v['hot_comment']} ”</div>" if v.get('hot_comment') else ""
+        <script>
+            let DATA = null;
+            const rendered = {};
+            const ESC = {'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'};
+            function esc(s) { return String(s).replace(/[&<>"']/g, c => ESC[c]); }
+            function card(id, type) {
+                const v = DATA.videos[id];
+                let badges = '';
+                if (v.f) badges += `<div class='badge-item'>${esc(v.f)} Region</div>`;
+                if (v.h) badges += `<div class='badge-item'>💬 Hot</div>`;
+                if (type === 'breakout' && v.r != null) badges += `<div class='badge-item' style='color:#d35400'>⚡ ${v.r}x Viral</div>`;
+                return `<div class="card">
+                    <div class="cover-wrap" onclick="play(this, '${esc(id)}')">
+                        <img src="${esc(v.img)}" loading="lazy">
+                        <div class="badge-top-right">${badges}</div>
+                        <div class="play-btn"></div>
+                    </div>
+                    <div class="info">
+                        <div class="title-zh">${esc(v.t)}</div>
+                        <div class="title-org">${esc(v.o || '')}</div>
+                        <div class="meta-row">
+                            <span class="channel-name">${esc(v.c)}</span>
+                            <span>${esc(v.v)}</span>
+                        </div>
+                        ${v.h ? `<div class='comment'>“ ${esc(v.h)} ”</div>` : ''}
+                    </div>
+                </div>`;
+            }
+            function render(id) {
+                if (!DATA || rendered[id]) return;
+                document.getElementById(id).innerHTML = DATA.tabs[id].map(([title, type, ids]) =>
+                    `<div class="section-title">${esc(title)}</div><div class="grid">` +
+                    (ids.length ? ids.map(i => card(i, type)).join('') : "<p style='color:#666'>Searching...</p>") +
+                    `</div>`).join('');
+                rendered[id] = true;
+            }
+""" + TAB_SCRIPT.substitute(on_show="                render(id);\n") + """            fetch('data.json').then(r => r.json()).then(d => {
+                DATA = d;
+                render(document.querySelector('.tab.active').id);
+            });
+        </script>
+    </body>
+    </html>
+"""
 
-        s = v.get('statistics', {})
-        view_cnt = int(s.get('viewCount', 0))
-        label_view = f"{round(view_cnt/1000, 1)}K Views"
-        
-        t_zh = v.get('title_dual', {}).get('zh', v['snippet']['title'])
-        t_org = v.get('title_dual', {}).get('org', '')
-        if t_zh == t_org: t_org = ""
+TAB_OPEN = Template("""
+            <!-- $comment -->
+            <div id="$id" class="$cls">""")
+TAB_CLOSE = """
+            </div>
+"""
+SECTION_OPEN = Template("""
+                <div class="section-title">$title</div>
+                <div class="grid">""")
+SECTION_CLOSE = "</div>"
+EMPTY_GRID = "<p style='color:#666'>Searching...</p>"
 
-        html += f"""
+CARD = Template("""
         <div class="card">
-            <div class="cover-wrap" onclick="play(this, '{v['id']}')">
-                <img src="{v.get('cover')}" loading="lazy">
+            <div class="cover-wrap" onclick="play(this, '$id')">
+                <img src="$cover" loading="lazy">
                 <div class="badge-top-right">
-                    {badges}
+                    $badges
                 </div>
                 <div class="play-btn"></div>
             </div>
             <div class="info">
-                <div class="title-zh">{t_zh}</div>
-                <div class="title-org">{t_org}</div>
+                <div class="title-zh">$title_zh</div>
+                <div class="title-org">$title_org</div>
                 <div class="meta-row">
-                    <span class="channel-name">{v['snippet']['channelTitle']}</span>
-                    <span>{label_view}</span>
+                    <span class="channel-name">$channel</span>
+                    <span>$views</span>
                 </div>
-                {comm}
+                $comment
             </div>
         </div>
-        """
-    return html
+        """)
+BADGE_REGION = Template("<div class='badge-item'>$flag Region</div>")
+BADGE_HOT = "<div class='badge-item'>💬 Hot</div>"
+BADGE_VIRAL = Template("<div class='badge-item' style='color:#d35400'>⚡ ${ratio}x Viral</div>")
+COMMENT = Template("<div class='comment'>“ $text ”</div>")
+
+DATE_RE = re.compile(r'<div class="date">.*?</div>')
+
+def file_digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def page_digest(path):
+    # 页面内容哈希, 不计日期: 只有日期变了不算变化
+    with open(path, encoding='utf-8') as f:
+        return hashlib.sha256(DATE_RE.sub('', f.read(), count=1).encode('utf-8')).hexdigest()
 
-def main():
+@contextmanager
+def atomic_write(path, digest=None):
+    # 先写同目录下的临时文件, 成功后 os.replace, 中途出错不会留下半个文件
+    # 给了 digest 时, 新旧内容哈希相同就不动原文件 (workflow 也就不会产生提交)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            yield f
+        if digest and os.path.exists(path) and digest(tmp) == digest(path):
+            print(f"{path} 内容无变化, 跳过写入")
+            os.unlink(tmp)
+            return
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+def write_precompressed(path):
+    # 生成 .gz / .br 预压缩副本 (未安装 brotli 时只生成 .gz); 内容不变则不重写
+    with open(path, 'rb') as f:
+        data = f.read()
+    outputs = [(path + '.gz', gzip.compress(data, 9, mtime=0))]
+    if brotli: outputs.append((path + '.br', brotli.compress(data, quality=11)))
+    for out, blob in outputs:
+        if os.path.exists(out):
+            with open(out, 'rb') as f:
+                if f.read() == blob: continue
+        with open(out, 'wb') as f:
+            f.write(blob)
+
+def edition_path(path, lang):
+    # index.html -> index.en.html; 主语言保持原文件名
+    if lang == TARGET_LANG: return path
+    name, ext = os.path.splitext(path)
+    return f"{name}.{lang}{ext}"
+
+def card_data(v, breakout, lang=TARGET_LANG):
+    # json 模式下每个视频只存一份, 各标签页只引用 id
+    title, comment = v.localized(lang)
+    t_zh = title or v.title
+    item = {'t': t_zh, 'c': v.channel_title, 'v': f"{round(v.view_cnt/1000, 1)}K Views", 'img': v.cover}
+    if title and v.title != t_zh: item['o'] = v.title
+    if v.region_flag: item['f'] = v.region_flag
+    if comment: item['h'] = comment
+    if breakout and v.viral_ratio is not None: item['r'] = round(v.viral_ratio, 1)
+    return item
+
+def generate_json_site(today_str, tabs, lang=TARGET_LANG):
+    videos = {}
+    data_tabs = {}
+    for tab_id, _, sections in tabs:
+        data_tabs[tab_id] = []
+        for title, items, type in sections:
+            for v in items:
+                videos.setdefault(v.id, {}).update(card_data(v, type == 'breakout', lang))
+            data_tabs[tab_id].append([title, type, [v.id for v in items]])
+
+    data_path, page_path = edition_path("data.json", lang), edition_path("index.html", lang)
+    with atomic_write(data_path, digest=file_digest) as f:
+        json.dump({'videos': videos, 'tabs': data_tabs}, f, ensure_ascii=False, separators=(',', ':'), sort_keys=True)
+    with atomic_write(page_path, digest=page_digest) as f:
+        f.write(PAGE_HEAD.substitute(today=html.escape(today_str)))
+        for i, (tab_id, comment, _) in enumerate(tabs):
+            f.write(TAB_OPEN.substitute(comment=comment, id=tab_id, cls='tab active' if i == 0 else 'tab'))
+            f.write(TAB_CLOSE)
+        # 壳页面加载本语言版本的数据文件
+        f.write(SHELL_TAIL.replace("fetch('data.json')", f"fetch('{data_path}')"))
+    for path in (page_path, data_path):
+        write_precompressed(path)
+
+def page_tabs(breakout, liked_set, discuss_set, brands, creators):
+    # 页面结构: [(标签 id, 注释, [(分区标题, 视频, 卡片类型)])]; 翻译和统计也按这里的分组, 只处理页面上出现的视频
+    return [
+        ('breakout', '1. Breakout Hits (黑马)', [('🚀 Viral & Trending', breakout, 'breakout')]),
+        ('liked', '2. Liked (分层)', [
+            ('🎵 Music', liked_set['music'], 'music'),
+            ('🎪 Entertainment', liked_set['ent'], 'ent'),
+            ('💡 Deep Dive', liked_set['content'], 'content'),
+        ]),
+        ('discussed', '3. Discussed (分层)', [('💬 Hot Discussions', discuss_set['content'], 'content')]),
+        ('brands', '4. Brands', [('💎 Brand Zone', brands, 'brand')]),
+        ('creators', '5. Creators', [('🎨 Creator Zone', creators, 'creator')]),
+    ]
+
+def rendered_videos(tabs):
+    # 按对象去重
+    selected = {}
+    for _, _, sections in tabs:
+        for _, videos, _ in sections:
+            for v in videos: selected.setdefault(id(v), v)
+    return list(selected.values())
+
+@instrumented('generate_html')
+def generate_html(breakout, liked_set, discuss_set, brands, creators, lang=TARGET_LANG):
+    today_str = get_beijing_time_str()
+    tabs = page_tabs(breakout, liked_set, discuss_set, brands, creators)
+    if OUTPUT_MODE == 'json': return generate_json_site(today_str, tabs, lang)
+
+    with atomic_write(edition_path("index.html", lang), digest=page_digest) as f:
+        f.write(PAGE_HEAD.substitute(today=html.escape(today_str)))
+        for i, (tab_id, comment, sections) in enumerate(tabs):
+            f.write(TAB_OPEN.substitute(comment=comment, id=tab_id, cls='tab active' if i == 0 else 'tab'))
+            for title, videos, type in sections:
+                f.write(SECTION_OPEN.substitute(title=title))
+                f.writelines(iter_cards(videos, type, lang))
+                f.write(SECTION_CLOSE)
+            f.write(TAB_CLOSE)
+        f.write(PAGE_TAIL)
+
+def generate_editions(breakout, liked_set, discuss_set, brands, creators):
+    # 各语言版本只差译文, 并发渲染
+    with ThreadPoolExecutor(max_workers=len(EDITIONS)) as pool:
+        list(pool.map(lambda lang: generate_html(breakout, liked_set, discuss_set, brands, creators, lang), EDITIONS))
+
+def render_card(v, type, lang=TARGET_LANG):
+    title, comment = v.localized(lang)
+    esc = html.escape
+    badges = ""
+    # 1. 地区标
+    if v.region_flag: badges += BADGE_REGION.substitute(flag=esc(v.region_flag))
+    # 2. 评论标
+    if comment: badges += BADGE_HOT
+    # 3. 黑马标
+    if type == 'breakout' and v.viral_ratio is not None:
+        badges += BADGE_VIRAL.substitute(ratio=round(v.viral_ratio, 1))
+
+    t_zh = title or v.title
+    t_org = v.title if title else ""
+    if t_zh == t_org: t_org = ""
+
+    return CARD.substitute(
+        id=esc(v.id), cover=esc(v.cover), badges=badges,
+        title_zh=esc(t_zh), title_org=esc(t_org), channel=esc(v.channel_title),
+        views=f"{round(v.view_cnt/1000, 1)}K Views",
+        # 评论文字
+        comment=COMMENT.substitute(text=esc(comment)) if comment else "",
+    )
+
+def iter_cards(videos, type, lang=TARGET_LANG):
+    if not videos:
+        yield EMPTY_GRID
+        return
+    for v in videos:
+        yield render_card(v, type, lang)
+
+def render_cards(videos, type, lang=TARGET_LANG):
+    return "".join(iter_cards(videos, type, lang))
+
+def write_metrics():
+    report = metrics.report()
+    report['caches'] = {c.name: {'hits': c.hits, 'misses': c.misses} for c in _caches}
+    report['etag'] = etag_stats
+    report['snapshots'] = {'reused': snapshots.reused, 'fresh': snapshots.fresh}
+    report['breakers'] = {name: b.stats() for name, b in sorted(_breakers.items())}
+    report['deadline_left_s'] = round(run_deadline.remaining(), 1)
+    with atomic_write(METRICS_FILE) as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"运行指标已写入 {METRICS_FILE}: 总耗时 {report['wall_s']}s, 配额 {report['quota_total']} 单位")
+
+def run_dag(tasks, serial=False):
+    # tasks: [(名称, 函数, [依赖名称])], 按依赖顺序给出; 函数的参数依次是各依赖的结果
+    # 并发时每个任务占一个线程, 先等依赖完成再执行, 互不依赖的任务同时运行
+    if serial:
+        results = {}
+        for name, fn, deps in tasks:
+            results[name] = fn(*[results[d] for d in deps])
+        return results
+    futures = {}
+    with ThreadPoolExecutor(max_workers=len(tasks)) as pool:
+        for name, fn, deps in tasks:
+            waits = [futures[d] for d in deps]
+            futures[name] = pool.submit(lambda fn=fn, waits=waits: fn(*[f.result() for f in waits]))
+        return {name: f.result() for name, f in futures.items()}
+
+def select_for_translation(pool, brands, creators):
+    # 翻译阶段: 页面上出现的视频去重后一次完成
+    return translate_editions(rendered_videos(page_tabs(*pool, brands, creators)))
+
+def main(serial=False):
     youtube = get_youtube_service()
     if not youtube: return
-    
-    breakout, liked_set, discuss_set = fetch_categorized_global_pool(youtube)
-    brands = fetch_channel_videos(youtube, BRAND_CHANNELS)
-    creators = fetch_channel_videos(youtube, CREATOR_CHANNELS)
-    
-    generate_html(breakout, liked_set, discuss_set, brands, creators)
+    if FIXTURE_MODE == 'record': _write_fixture('meta', 'run', {'date': get_beijing_time_str()})
+
+    try:
+        # 三个抓取分支互不依赖, 并发执行 (共用限流器和 HTTP 连接缓存), 都完成后再翻译和渲染
+        results = run_dag([
+            ('pool', lambda: fetch_categorized_global_pool(youtube), []),
+            ('brands', lambda: fetch_channel_videos(youtube, BRAND_CHANNELS), []),
+            ('creators', lambda: fetch_channel_videos(youtube, CREATOR_CHANNELS), []),
+            ('translate', select_for_translation, ['pool', 'brands', 'creators']),
+            ('render', lambda pool, brands, creators, _: generate_editions(*pool, brands, creators),
+             ['pool', 'brands', 'creators', 'translate']),
+        ], serial=serial)
+
+        run_date = get_beijing_time_str()
+        snapshots.save_videos(run_date, results['translate'])
+        snapshots.prune(run_date)
+        print(f"快照: 沿用 {snapshots.reused} 条, 新处理 {snapshots.fresh} 条")
+    finally:
+        # 中途失败也保存缓存和运行指标
+        for cache in _caches:
+            cache.prune()
+            print(cache.stats())
+        for endpoint, stat in sorted(etag_stats.items()):
+            print(f"ETag {endpoint}: {stat['not_modified']}/{stat['requests']} 次 304, "
+                  f"省 {stat['bytes_saved']} 字节 / {stat['quota_saved']} 配额单位")
+        for breaker in _breakers.values():
+            if breaker.trips: print(f"熔断 {breaker.name}: {breaker.trips} 次, 拒绝 {breaker.rejected} 次调用 (已降级处理)")
+        if run_deadline.remaining() <= 0: print("已超过运行截止时间, 剩余步骤按降级结果输出")
+        write_metrics()
 
 if __name__ == "__main__":
-    main()
+    # --serial: 各分支依次执行, 便于调试
+    main(serial='--serial' in sys.argv[1:])
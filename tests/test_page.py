@@ -0,0 +1,63 @@
+# 生成的页面标签必须成对闭合 (容器 div 漏关过一次)
+import os
+import sys
+import tempfile
+from html.parser import HTMLParser
+
+os.environ['CACHE_DIR'] = tempfile.mkdtemp(prefix="vision-test-")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+
+VOID_TAGS = {'meta', 'link', 'img', 'br', 'hr', 'input', 'source'}
+
+class TagBalance(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.stack, self.errors = [], []
+
+    def handle_starttag(self, tag, attrs):
+        if tag not in VOID_TAGS: self.stack.append(tag)
+
+    def handle_endtag(self, tag):
+        if not self.stack or self.stack[-1] != tag:
+            self.errors.append(f"line {self.getpos()[0]}: </{tag}>, open: {self.stack[-3:]}")
+        else:
+            self.stack.pop()
+
+def check_balance(path):
+    parser = TagBalance()
+    with open(path, encoding='utf-8') as f:
+        parser.feed(f.read())
+    parser.close()
+    assert not parser.errors, parser.errors
+    assert not parser.stack, f"unclosed: {parser.stack}"
+
+def make_video(i, category):
+    v = main.VideoRecord(f"v{i}", f"title <{i}>", f"UC{i}", "chan & co", "img", category, 300)
+    v.set_statistics({'viewCount': 100000 + i, 'likeCount': i, 'commentCount': i})
+    v.region_flag = "🇺🇸"
+    return v
+
+def generate(tmpdir):
+    videos = [make_video(i, c) for i, c in enumerate(['10', '24', '22', '28'])]
+    videos[0].viral_ratio = 4.2
+    videos[1].title_zh, videos[1].hot_comment = "标题", "评论 <b>"
+    liked = {'music': videos[:1], 'ent': [], 'content': videos[2:]}
+    discussed = {'content': videos[1:3]}
+    cwd = os.getcwd()
+    os.chdir(tmpdir)
+    try:
+        main.generate_html(videos[:1], liked, discussed, videos[3:], [])
+    finally:
+        os.chdir(cwd)
+    return os.path.join(tmpdir, "index.html")
+
+def test_html_page_tags_balance():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        check_balance(generate(tmpdir))
+
+def test_json_shell_tags_balance(monkeypatch):
+    monkeypatch.setattr(main, 'OUTPUT_MODE', 'json')
+    with tempfile.TemporaryDirectory() as tmpdir:
+        check_balance(generate(tmpdir))
@@ -0,0 +1,53 @@
+# 排名引擎的 top-k 结果必须和原先 "分桶 -> 按点赞排序 -> 按评论数稳定排序 -> 截断" 完全一致
+import os
+import sys
+import random
+import tempfile
+
+os.environ['CACHE_DIR'] = tempfile.mkdtemp(prefix="vision-test-")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+
+def make_pool(rnd, n, n_channels=20):
+    # 点赞、评论取值范围很小, 制造大量同分
+    videos = []
+    for i in range(n):
+        v = main.VideoRecord(f"v{i}", f"title {i}", f"UC{rnd.randrange(n_channels)}", "chan", "img",
+                             rnd.choice(['10', '24', '22', '28', '17']), 300)
+        v.set_statistics({'viewCount': rnd.randint(1000, 200000), 'likeCount': rnd.randint(0, 30),
+                          'commentCount': rnd.randint(0, 5)})
+        videos.append(v)
+    subs_map = {f"UC{c}": rnd.randint(1, 50000) for c in range(n_channels - 2)}
+    return videos, subs_map
+
+def baseline_rank(videos, subs_map):
+    # 原实现: 各桶整体排序后切片
+    breakout, music, ent, content = [], [], [], []
+    for v in videos:
+        ratio = v.view_cnt / subs_map.get(v.channel_id, 10000000)
+        if ratio > 3.0 and v.view_cnt > 50000: breakout.append((v, ratio))
+        elif v.category == '10': music.append(v)
+        elif v.category == '24': ent.append(v)
+        else: content.append(v)
+    breakout.sort(key=lambda x: x[1], reverse=True)
+    for bucket in (music, ent, content): bucket.sort(key=lambda x: x.like_cnt, reverse=True)
+    liked = [music[:7], ent[:5], content[:35]]
+    for bucket in (music, ent, content): bucket.sort(key=lambda x: x.comm_cnt, reverse=True)
+    discussed = [music[:7], ent[:5], content[:35]]
+    return [v for v, _ in breakout[:20]], liked, discussed
+
+def ids(group):
+    return [v.id for v in group]
+
+def test_rank_pool_matches_baseline_sort():
+    for seed in range(300):
+        rnd = random.Random(seed)
+        videos, subs_map = make_pool(rnd, rnd.randint(0, 300))
+        breakout, liked, discussed = baseline_rank(videos, subs_map)
+        top_breakout, liked_set, discuss_set = main.rank_pool(videos, subs_map)
+        assert ids(top_breakout) == ids(breakout), seed
+        for name, group in zip(['music', 'ent', 'content'], liked):
+            assert ids(liked_set[name]) == ids(group), (seed, name)
+        for name, group in zip(['music', 'ent', 'content'], discussed):
+            assert ids(discuss_set[name]) == ids(group), (seed, name)
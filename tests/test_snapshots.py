@@ -0,0 +1,64 @@
+# 快照库: 哪些字段沿用、哪些不该写进去
+import os
+import sys
+import tempfile
+
+os.environ['CACHE_DIR'] = tempfile.mkdtemp(prefix="vision-test-")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+
+def make_video(vid, title="title"):
+    v = main.VideoRecord(vid, title, "UC1", "chan", "img", "22", 300)
+    v.set_statistics({'viewCount': 1000, 'likeCount': 10, 'commentCount': 1})
+    return v
+
+def test_restore_without_comments_keeps_only_titles():
+    store = main.SnapshotStore(":memory:")
+    charted = make_video("v1")
+    charted.title_zh, charted.hot_comment_org, charted.hot_comment = "标题", "great", "很棒"
+    store.save_videos("2024-05-01", [charted])
+
+    # 同一视频又出现在品牌/创作者列表里: 只沿用标题译文
+    branded = make_video("v1")
+    store.restore([branded], "2024-05-02", comments=False)
+    assert branded.title_zh == "标题"
+    assert branded.hot_comment_org is None and not branded.hot_comment
+
+    hot = make_video("v1")
+    assert store.restore([hot], "2024-05-02") == []
+    assert (hot.hot_comment_org, hot.hot_comment) == ("great", "很棒")
+
+class FakeChannels:
+    def channels(self): return self
+
+    def list(self, **kwargs): return None
+
+def test_channel_subs_fall_back_to_snapshot(monkeypatch):
+    # 请求失败、缓存里也没有的频道, 用快照库里上次的订阅数
+    store = main.SnapshotStore(":memory:")
+    store.save_channels("2024-05-01", {"UC1": 1234})
+    monkeypatch.setattr(main, 'snapshots', store)
+    monkeypatch.setattr(main, 'get_beijing_time_str', lambda: "2024-05-02")
+    def fail(request, cost=1): raise OSError("network down")
+    monkeypatch.setattr(main, 'api_execute', fail)
+    assert main.get_channel_subs_batch(FakeChannels(), ["UC1", "UC2"]) == {"UC1": 1234}
+
+class BrokenTranslator:
+    def translate(self, text): raise LookupError("no translation")
+
+def test_failed_translation_is_not_saved(monkeypatch):
+    # 翻译失败时页面用原文兜底, 但快照里不能把原文当译文存下, 否则以后每天都沿用原文
+    store = main.SnapshotStore(":memory:")
+    monkeypatch.setattr(main, 'new_translator', lambda target: BrokenTranslator())
+    monkeypatch.setattr(main, 'translate_breaker', main.CircuitBreaker('translate', 5, 60))
+    v = make_video("v2", "untranslatable title")
+    v.hot_comment_org = "untranslatable comment"
+    main.translate_videos([v])
+    assert v.title_zh == "untranslatable title"
+    store.save_videos("2024-05-01", [v])
+
+    again = make_video("v2", "untranslatable title")
+    assert store.restore([again], "2024-05-02") == []
+    assert again.title_zh is None
+    assert again.hot_comment_org == "untranslatable comment" and again.hot_comment == ""
@@ -0,0 +1,39 @@
+# 翻译的熔断只认瞬时故障: 译不出来的内容不能让整段翻译停掉
+import os
+import sys
+import tempfile
+
+os.environ['CACHE_DIR'] = tempfile.mkdtemp(prefix="vision-test-")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from deep_translator.exceptions import TranslationNotFound
+import main
+
+class CountingTranslator:
+    def __init__(self, exc):
+        self.exc = exc
+        self.calls = 0
+
+    def translate(self, text):
+        self.calls += 1
+        raise self.exc
+
+def test_non_transient_error_does_not_trip_breaker(monkeypatch):
+    breaker = main.CircuitBreaker('translate', 2, 60)
+    translator = CountingTranslator(TranslationNotFound("text"))
+    monkeypatch.setattr(main, 'translate_breaker', breaker)
+    monkeypatch.setattr(main, 'new_translator', lambda target: translator)
+    texts = [f"no translation {i}" for i in range(5)]
+    assert main.translate_batch(texts) == {t: t for t in texts}
+    # 一次拼接请求 + 逐条回退各一次, 不重试
+    assert translator.calls == 1 + len(texts)
+    assert breaker.stats() == {'trips': 0, 'rejected': 0, 'open': False}
+
+def test_transient_error_trips_breaker(monkeypatch):
+    breaker = main.CircuitBreaker('translate', 2, 60)
+    monkeypatch.setattr(main, 'translate_breaker', breaker)
+    monkeypatch.setattr(main, 'new_translator', lambda target: CountingTranslator(ConnectionError("reset")))
+    monkeypatch.setattr(main, 'RETRY_MAX', 0)
+    texts = [f"network down {i}" for i in range(5)]
+    assert main.translate_batch(texts) == {t: t for t in texts}
+    assert breaker.stats()['trips'] == 1 and breaker.is_open()